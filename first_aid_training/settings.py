@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,10 +43,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'training.staticfiles.StaticFilesMiddleware',
+    'training.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'training.profiling.ProfilingMiddleware',
+    'training.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,7 +59,8 @@ ROOT_URLCONF = 'first_aid_training.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # The Django backend, timing renders for training.metrics
+        'BACKEND': 'training.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +87,91 @@ DATABASES = {
     }
 }
 
+# SQLite tuning for concurrent quiz submissions, selected with the
+# DATABASE_PROFILE environment variable. 'default' keeps SQLite's stock
+# behaviour; 'performance' switches to WAL journaling, keeps connections
+# open between requests and takes the write lock when a transaction
+# starts (IMMEDIATE) so writers queue on busy_timeout instead of failing
+# with "database is locked". The pragmas are applied to every new
+# connection by training.db.apply_sqlite_pragmas.
+# Compare both with: python manage.py benchmark_sqlite
+
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'default')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 20000))
+SQLITE_PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': SQLITE_BUSY_TIMEOUT_MS,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # KiB
+}
+SQLITE_PRAGMAS = {}
+
+if DATABASE_PROFILE == 'performance':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    SQLITE_PRAGMAS = SQLITE_PERFORMANCE_PRAGMAS
+
+# Read replicas for the leaderboard, profile, achievements and modules
+# pages, see training.routers. DATABASE_REPLICAS is a comma-separated list
+# of SQLite files; locally, copy the primary into them with
+# python manage.py sync_replicas. Sessions that just submitted something
+# keep reading from the primary for READ_YOUR_WRITES_SECONDS.
+
+REPLICA_DATABASES = []
+for index, name in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(','))):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['training.routers.PrimaryReplicaRouter']
+READ_YOUR_WRITES_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory caches are per process and evict least recently used entries
+# past MAX_ENTRIES. With several worker processes point 'stats' at a shared
+# backend (Redis, Memcached, database) so invalidations reach every worker,
+# including those made by management commands such as backfill_achievements,
+# which run in a process of their own.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stats': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'user-stats',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Cache alias used for per-user stats (profile, leaderboard)
+STATS_CACHE_ALIAS = 'stats'
+
+# Cache alias holding the module/scenario catalogue version (training.catalogue).
+# Needs to be shared between processes, e.g. memcached or redis, for an admin
+# edit to reach every worker.
+CATALOGUE_CACHE_ALIAS = 'default'
+
+# Cache alias for rendered learning pages (training.pagecache)
+PAGE_CACHE_ALIAS = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -119,6 +210,27 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
+# collectstatic writes content-hashed copies plus .gz/.br siblings here, which
+# training.staticfiles.StaticFilesMiddleware serves with far-future caching
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'training.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Responsive WebP/AVIF variants of the PNG/JPEG images under static/,
+# generated by `python manage.py build_images` (needs Pillow) and used by
+# the {% picture %} and {% image_url %} tags in training/templatetags/images.py.
+# Without a build the tags fall back to the original files.
+IMAGE_OUTPUT_DIR = BASE_DIR / 'static' / 'optimized'
+IMAGE_WIDTHS = [640, 1280, 1920]
+IMAGE_FORMATS = {'avif': 55, 'webp': 80}  # format: encoder quality, preferred first
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -128,3 +240,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'profile'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Quiz and scenario submissions: 'sync' writes them during the request,
+# 'buffered' queues them for training.pipeline to write in batches
+SUBMISSION_MODE = 'sync'
+SUBMISSION_BUFFER = {
+    'SPOOL_DIR': BASE_DIR / 'spool',
+    'FLUSH_INTERVAL_MS': 200,
+    'MAX_BATCH': 100,
+}
+
+# Leaderboard: trainees per page, and how many are shown either side of you
+LEADERBOARD_PAGE_SIZE = 25
+LEADERBOARD_WINDOW = 5
+
+# Per-view request metrics (training.metrics), served to staff at /metrics/.
+# With several worker processes, point METRICS_DIR at a directory they all
+# share so every scrape reports the whole server.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 5
+
+# Sampling profiler (training.profiling). A request is profiled when it sends
+# an X-Profile header equal to TOKEN, when a staff member adds ?profile=1, or
+# at random at SAMPLE_RATE (0.01 is one request in a hundred). Collapsed
+# stacks go to DIR, one file per view, rotated at MAX_BYTES; merge them with
+# manage.py merge_profiles.
+PROFILING = {
+    'DIR': BASE_DIR / 'spool' / 'profiles',
+    'TOKEN': os.environ.get('PROFILE_TOKEN', ''),
+    'SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE') or 0),
+    'INTERVAL_MS': 2,
+    'MAX_BYTES': 5 * 1024 * 1024,
+    'BACKUP_COUNT': 3,
+}
+
+# Slow-query log (training.slowqueries), off unless SLOW_QUERY_LOG names a
+# file, e.g. spool/slow_queries.jsonl. Queries taking SLOW_QUERY_MS or more
+# are logged as JSON lines with their plan and the view line behind them.
+# Summarise with manage.py slow_queries.
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or None
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS') or 100)
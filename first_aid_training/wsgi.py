@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'first_aid_training.settings')
 
 application = get_wsgi_application()
+
+# Replays the submission spools of workers that died, see training.pipeline
+from training.pipeline import start_submission_buffer  # noqa: E402
+
+start_submission_buffer()
@@ -0,0 +1,291 @@
+// Plays a scenario from the step graph built by training/scenariograph.py.
+//
+// The page provides the dialogue box, progress bar, timer and result card;
+// every step's narration, options, images and score come from the graph.
+// On entering a step the engine hints the browser to fetch the images of
+// the steps that can follow, so the next background is already cached.
+const ScenarioEngine = (function() {
+    let graph = null;
+    let score = 0;
+    let timeLeft = 0;
+    let scenarioInterval = null;
+    let challengeTimers = [];
+    let visits = {};
+    const hinted = {};
+
+    function start(graphUrl) {
+        $.getJSON(graphUrl, function(data) {
+            graph = data;
+            timeLeft = graph.timeLimit;
+            startScenarioTimer();
+            enter(graph.start);
+        });
+    }
+
+    // --- Timers ---
+
+    function startScenarioTimer() {
+        updateScenarioTimerDisplay();
+        scenarioInterval = setInterval(() => {
+            timeLeft--;
+            updateScenarioTimerDisplay();
+            if (timeLeft <= 0) {
+                stopScenarioTimer();
+                if (graph.steps[graph.timeout]) {
+                    enter(graph.timeout);
+                }
+            }
+        }, 1000);
+    }
+
+    function stopScenarioTimer() {
+        clearInterval(scenarioInterval);
+        scenarioInterval = null;
+    }
+
+    function updateScenarioTimerDisplay() {
+        const minutes = Math.floor(timeLeft / 60);
+        const seconds = timeLeft % 60;
+        $('#scenario-timer').text(`Time: ${minutes}:${seconds < 10 ? '0' : ''}${seconds}`);
+    }
+
+    function later(callback, ms, repeat = false) {
+        challengeTimers.push(repeat ? setInterval(callback, ms) : setTimeout(callback, ms));
+    }
+
+    function clearChallengeTimers() {
+        challengeTimers.forEach(timer => { clearInterval(timer); clearTimeout(timer); });
+        challengeTimers = [];
+    }
+
+    // --- Prefetching ---
+
+    function hint(url, rel) {
+        // A prefetched image that is now one step away is upgraded to preload
+        if (hinted[url] === 'preload' || hinted[url] === rel) {
+            return;
+        }
+        hinted[url] = rel;
+        $('<link>', { rel: rel, href: url, as: 'image' }).appendTo('head');
+    }
+
+    function prefetchFrom(step) {
+        (step.preload || []).forEach(url => hint(url, 'preload'));
+        (step.prefetch || []).forEach(url => hint(url, 'prefetch'));
+    }
+
+    // --- Steps ---
+
+    function enter(key) {
+        const step = { key: key, ...graph.steps[key] };
+        clearChallengeTimers();
+        visits[key] = (visits[key] || 0) + 1;
+        prefetchFrom(step);
+
+        setProgress(step.progress || 0);
+        if (step.image) {
+            $('.scenario-bg').css({
+                'background-image': `url('${step.image}')`,
+                'background-size': 'cover',
+                'background-repeat': 'no-repeat',
+                'background-position': 'center center'
+            });
+        }
+        $('#dialogue-text').empty()
+            .append($('<strong>').text(`${step.speaker}:`))
+            .append(document.createTextNode(' ' + step.narration));
+        $('#option-heading').text(step.heading || '');
+
+        const container = $('#options-container .d-inline-flex').empty();
+        const options = step.options || [];
+        if (options.length === 0) {
+            finish(step);
+        } else if (step.kind === 'dial') {
+            dialChallenge(step, container);
+        } else if (step.kind === 'wrap') {
+            wrapChallenge(step, container);
+        } else if (step.kind === 'heimlich') {
+            heimlichChallenge(step, container);
+        } else if (options.some(option => option.image)) {
+            const tiles = $('<div class="d-flex flex-wrap gap-3 justify-content-center">').appendTo(container);
+            options.forEach(option => tiles.append(imageOption(option)));
+        } else {
+            options.forEach(option => {
+                $('<button class="btn btn-light text-start mb-2">').text(option.text)
+                    .on('click', () => choose(option)).appendTo(container);
+            });
+        }
+    }
+
+    function imageOption(option) {
+        const tile = $('<div class="position-relative rounded-circle overflow-hidden border" style="width: 120px; height: 120px; cursor: pointer;">')
+            .on('click', () => choose(option));
+        $('<img class="w-100 h-100 object-fit-cover">').attr({ src: option.image, alt: option.text || '' }).appendTo(tile);
+        if (option.text) {
+            $('<div class="position-absolute text-light top-0 start-0 w-100 h-100 bg-white bg-opacity-25 d-flex align-items-center justify-content-center fw-bold">')
+                .text(option.text).appendTo(tile);
+        }
+        return tile;
+    }
+
+    function choose(option) {
+        score += option.scoreDelta || 0;
+        enter(option.next);
+    }
+
+    function resolve(step, outcome) {
+        clearChallengeTimers();
+        // A repeated challenge can end differently, e.g. a second round of thrusts
+        const repeated = visits[step.key] > 1 ? step.options.find(option => option.outcome === `${outcome}-again`) : null;
+        const option = repeated || step.options.find(option => option.outcome === outcome);
+        if (option) {
+            choose(option);
+        }
+    }
+
+    function setProgress(percent) {
+        $('#progress-bar').css('width', percent + '%').attr('aria-valuenow', percent);
+        if (percent >= 100) {
+            stopScenarioTimer();
+        }
+    }
+
+    function finish(step) {
+        stopScenarioTimer();
+        const finalScore = Math.max(0, Math.min(100, score + (step.score || 0)));
+        $('#scoreInput').val(finalScore);
+        $('<button class="btn btn-primary">').text('Show Score').on('click', showScore)
+            .appendTo('#options-container .d-inline-flex');
+    }
+
+    function showScore() {
+        const timeTaken = graph.timeLimit - timeLeft;
+        $('#timeSpentInput').val(timeTaken);
+        const finalScore = parseInt($('#scoreInput').val(), 10);
+
+        let message = "";
+        if (finalScore >= 85) {
+            message = "Outstanding! You handled the situation like a pro!";
+        } else if (finalScore >= 60) {
+            message = "Great job! There's some room for improvement.";
+        } else {
+            message = "You need more practice. Review your techniques!";
+        }
+
+        $('#finalScore').text("You scored: " + finalScore + " points!");
+        $('#scoreMessage').text(message);
+        $('#timeMessage').text("Time taken: " + timeTaken + " seconds.");
+        $('#resultCard').removeClass('d-none').css({
+            'background-color': 'transparent',
+            'box-shadow': 'none'
+        });
+        $('#dialogbox').addClass('d-none');
+    }
+
+    // --- Challenges, each resolves to the option with the matching outcome ---
+
+    function dialChallenge(step, container) {
+        // Either emergency number, 108 or 112, within 5 seconds
+        const codes = [[1, 0, 8], [1, 1, 2]];
+        let progress = codes.map(() => 0);
+        let secondsLeft = 5;
+
+        $('<div class="mb-2 text-muted">').text('Dialing: ').append($('<span id="dial-sequence">')).appendTo(container);
+        const timer = $('<div class="fw-semibold mb-3">').appendTo(container);
+        const pad = $('<div class="d-flex flex-wrap gap-2 justify-content-center" style="max-width: 260px;">').appendTo(container);
+        const showTime = () => timer.text(`Time left: ${secondsLeft}s`);
+        showTime();
+
+        [1, 2, 3, 4, 5, 6, 7, 8, 9, 0].forEach(digit => {
+            $('<button class="btn btn-light" style="width: 60px; height: 60px;">').text(digit).on('click', () => {
+                $('#dial-sequence').append(digit);
+                progress = progress.map((index, n) => index !== -1 && codes[n][index] === digit ? index + 1 : -1);
+                if (progress.some((index, n) => index === codes[n].length)) {
+                    resolve(step, 'success');
+                } else if (progress.every(index => index === -1)) {
+                    resolve(step, 'fail');
+                }
+            }).appendTo(pad);
+        });
+
+        later(() => {
+            secondsLeft--;
+            showTime();
+            if (secondsLeft <= 0) {
+                resolve(step, 'fail');
+            }
+        }, 1000, true);
+    }
+
+    function wrapChallenge(step, container) {
+        // Trace the figure of eight 5 times within 15 seconds
+        const wrapsNeeded = 5;
+        let wraps = 0;
+        let secondsLeft = 15;
+
+        const figure = $('<div style="position: relative; display: inline-block; margin: 20px auto;">').appendTo(container);
+        $('<img alt="Ankle" style="width: 200px; height: auto; display: block;">').attr('src', step.inset).appendTo(figure);
+        $('<div style="position: absolute; top: 50%; left: 50%; transform: translate(-85%, -50%) rotate(-50deg); font-size: 220px; color: black; opacity: 0.8; cursor: pointer; user-select: none;">8</div>')
+            .on('click', () => {
+                wraps++;
+                counter.text(`Wraps: ${wraps}/${wrapsNeeded}`);
+                if (wraps >= wrapsNeeded) {
+                    resolve(step, 'success');
+                }
+            }).appendTo(figure);
+        $('<i class="fa-solid fa-arrow-rotate-right" style="position: absolute; top: 28%; left: 8%; font-size: 40px; color: dimgrey; transform: rotate(-40deg);"></i>').appendTo(figure);
+        $('<i class="fa-solid fa-arrow-rotate-left" style="position: absolute; bottom: 20%; right: 40%; font-size: 45px; color: dimgrey; transform: rotate(30deg);"></i>').appendTo(figure);
+        const counter = $('<p class="text-center fw-bold">').text(`Wraps: 0/${wrapsNeeded}`).appendTo(container);
+        const timer = $('<div class="mb-2 text-secondary fw-bold text-center mt-3">').appendTo(container);
+        const showTime = () => timer.text(`⏳ Time left: ${secondsLeft}s`);
+        showTime();
+
+        later(() => {
+            secondsLeft--;
+            showTime();
+            if (secondsLeft <= 0) {
+                resolve(step, 'fail');
+            }
+        }, 1000, true);
+    }
+
+    function heimlichChallenge(step, container) {
+        // Alternate left and right thrusts, at most 4 seconds apart
+        const pattern = ['left', 'right', 'left', 'right', 'left'];
+        const maxDelaySeconds = 4;
+        let thrusts = 0;
+        let secondsLeft = maxDelaySeconds;
+
+        const status = $('<div class="mb-3 text-muted">').text('Start tapping!').appendTo(container);
+        const timer = $('<div class="fw-semibold mb-3">').appendTo(container);
+        const buttons = $('<div class="d-flex gap-3">').appendTo(container);
+        const showTime = () => timer.text(`Time left: ${secondsLeft}s`);
+        showTime();
+
+        [['left', '⬅️ Left Thrust'], ['right', '➡️ Right Thrust']].forEach(([direction, label]) => {
+            $('<button class="btn btn-light">').text(label).on('click', () => {
+                if (direction !== pattern[thrusts]) {
+                    resolve(step, 'partial');
+                    return;
+                }
+                thrusts++;
+                status.text(`✅ ${thrusts} thrust${thrusts > 1 ? 's' : ''} correct!`);
+                secondsLeft = maxDelaySeconds;
+                showTime();
+                if (thrusts === pattern.length) {
+                    resolve(step, 'success');
+                }
+            }).appendTo(buttons);
+        });
+
+        later(() => {
+            secondsLeft--;
+            showTime();
+            if (secondsLeft <= 0) {
+                resolve(step, 'fail');
+            }
+        }, 1000, true);
+    }
+
+    return { start: start };
+})();
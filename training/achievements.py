@@ -0,0 +1,74 @@
+import operator
+
+from django.db.models import Q
+
+from .models import Achievement, UserAchievement
+
+_OPERATORS = {
+    'exact': operator.eq,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+class AchievementRule:
+    """An achievement unlocked once a user's ``UserScore`` counters match.
+
+    Conditions are written as queryset lookups on ``UserScore`` so the same
+    rule can be checked against one row in Python or against every row in SQL.
+    """
+
+    def __init__(self, title, **lookups):
+        self.title = title
+        self.lookups = lookups
+        self.conditions = []
+        for lookup, value in lookups.items():
+            field, _, op = lookup.partition('__')
+            self.conditions.append((field, _OPERATORS[op or 'exact'], value))
+        self.depends_on = frozenset(field for field, _, _ in self.conditions)
+
+    def __repr__(self):
+        return f"AchievementRule({self.title!r})"
+
+    def matches(self, score):
+        return all(op(getattr(score, field), value) for field, op, value in self.conditions)
+
+    def as_q(self):
+        return Q(**self.lookups)
+
+
+RULES = [
+    AchievementRule('First Steps', completed_modules__gte=1),
+    AchievementRule('Life Saver', completed_modules=10),
+    AchievementRule('Quick Thinker', quick_completions__gte=1),
+    AchievementRule('Expert Medic', total_points__gte=1000),
+    AchievementRule('All Star', completed_modules=10, completed_scenarios=3),
+    AchievementRule('Academic Ace', completed_modules__gte=5),
+    AchievementRule('Simulation Pro', completed_scenarios__gte=3),
+    AchievementRule('Trailblazer', completed_scenarios__gte=1),
+    AchievementRule('Perfect Score', perfect_scores__gte=1),
+]
+
+
+def unlock_achievements(score, changed):
+    """Award every achievement whose rule now matches ``score``.
+
+    Only rules depending on one of the ``changed`` counters are checked, so
+    a submission that moves nothing costs no queries at all. Returns the
+    newly unlocked ``Achievement`` rows.
+    """
+    titles = [rule.title for rule in RULES if rule.depends_on & changed and rule.matches(score)]
+    if not titles:
+        return []
+
+    unlocked = list(
+        Achievement.objects.filter(title__in=titles)
+        .exclude(userachievement__user_id=score.user_id)
+    )
+    UserAchievement.objects.bulk_create(
+        [UserAchievement(user_id=score.user_id, achievement=achievement) for achievement in unlocked],
+        ignore_conflicts=True,
+    )
+    return unlocked
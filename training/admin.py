@@ -1,13 +1,44 @@
 from django.contrib import admin
-from .models import Module,UserModuleProgress, Scenario, UserScenarioProgress, Achievement,UserAchievement
+from .models import Module,UserModuleProgress, Scenario, UserScenarioProgress, Achievement,UserAchievement,UserScore,QuizAttempt,ScenarioAttempt,Question,Choice,ScenarioStep,ScenarioOption
 
 # Register your models here.
 
 admin.site.register(Scenario)
 admin.site.register(UserScenarioProgress)
 
+
+class ScenarioOptionInline(admin.TabularInline):
+    model = ScenarioOption
+    fk_name = 'step'
+    extra = 0
+
+
+@admin.register(ScenarioStep)
+class ScenarioStepAdmin(admin.ModelAdmin):
+    list_display = ('scenario', 'key', 'kind', 'progress', 'score')
+    list_filter = ('scenario', 'kind')
+    inlines = [ScenarioOptionInline]
+
+
 admin.site.register(Achievement)
 admin.site.register(UserAchievement)
 
 admin.site.register(Module)
-admin.site.register(UserModuleProgress)
\ No newline at end of file
+admin.site.register(UserModuleProgress)
+
+
+class ChoiceInline(admin.TabularInline):
+    model = Choice
+    extra = 0
+
+
+@admin.register(Question)
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('module', 'order', 'text')
+    list_filter = ('module',)
+    inlines = [ChoiceInline]
+
+
+admin.site.register(QuizAttempt)
+admin.site.register(ScenarioAttempt)
+admin.site.register(UserScore)
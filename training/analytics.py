@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from django.db.models import Avg, Count, Exists, Max, OuterRef, Q
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+
+from .models import QuizAttempt, ScenarioAttempt
+from .progress import SCENARIO_PASSING_SCORE
+
+_PERIODS = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _attempt_series(queryset, start, end, period, passing_score):
+    if period not in _PERIODS:
+        raise ValueError(f"period must be one of {', '.join(_PERIODS)}, not {period!r}")
+    return list(
+        queryset.filter(created_at__gte=start, created_at__lt=end)
+        .annotate(period=_PERIODS[period]('created_at'))
+        .values('period')
+        .annotate(
+            attempts=Count('pk'),
+            trainees=Count('user', distinct=True),
+            avg_score=Avg('score'),
+            best_score=Max('score'),
+            passed=Count('pk', filter=Q(score__gte=passing_score)),
+            avg_time_spent=Avg('time_spent'),
+        )
+        .order_by('period')
+    )
+
+
+def module_attempt_series(module, start, end, period='day'):
+    """Per-period attempt statistics for one module (record or instance) between ``start`` and ``end``.
+
+    Only the ``(module, created_at)`` index range is read, however long the
+    attempt log gets.
+    """
+    queryset = QuizAttempt.objects.filter(module_id=module.pk)
+    return _attempt_series(queryset, start, end, period, module.passing_score)
+
+
+def scenario_attempt_series(scenario, start, end, period='day'):
+    """Per-period attempt statistics for one scenario, see ``module_attempt_series``."""
+    queryset = ScenarioAttempt.objects.filter(scenario_id=scenario.pk)
+    return _attempt_series(queryset, start, end, period, SCENARIO_PASSING_SCORE)
+
+
+def learning_curve(module, start, end, max_attempts=10):
+    """Average score by attempt number for trainees who started ``module`` in the range.
+
+    Trainees whose first attempt at the module falls between ``start`` and
+    ``end`` are followed through their first ``max_attempts`` attempts,
+    including those made after ``end``. Returns a list of
+    ``(attempt_number, average_score, trainees)``.
+    """
+    attempts = QuizAttempt.objects.filter(module_id=module.pk)
+    earlier = attempts.filter(user_id=OuterRef('user_id'), created_at__lt=start)
+    starters = attempts.filter(created_at__gte=start, created_at__lt=end).exclude(Exists(earlier)).values('user_id')
+
+    totals = defaultdict(lambda: [0, 0])
+    attempt_number = 0
+    current_user = None
+    rows = (
+        attempts.filter(user_id__in=starters)
+        .order_by('user_id', 'created_at', 'pk')
+        .values_list('user_id', 'score')
+    )
+    for user_id, score in rows.iterator(chunk_size=2000):
+        if user_id != current_user:
+            current_user, attempt_number = user_id, 0
+        attempt_number += 1
+        if attempt_number <= max_attempts:
+            totals[attempt_number][0] += score
+            totals[attempt_number][1] += 1
+    return [(number, total / count, count) for number, (total, count) in sorted(totals.items())]
+
+
+def user_history(user, module=None, scenario=None):
+    """A trainee's attempts at one module or scenario, oldest first."""
+    if module is not None:
+        queryset = QuizAttempt.objects.filter(user=user, module=module)
+    else:
+        queryset = ScenarioAttempt.objects.filter(user=user, scenario=scenario)
+    return queryset.order_by('created_at').values('score', 'time_spent', 'created_at')
@@ -0,0 +1,134 @@
+"""In-process cache of the module and scenario catalogue.
+
+The ten ``Module`` and three ``Scenario`` rows only change through the
+admin or fixtures, so each process loads them once as immutable records
+and serves every lookup from memory. Saving or deleting one (see
+``training.signals``) bumps a version number kept in the
+``CATALOGUE_CACHE_ALIAS`` cache; every process compares its copy against
+that version and reloads when it moved. The rows are always read from the
+primary: a lagging replica's copy would stay cached under the new version.
+"""
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
+
+from . import versions
+from .models import Module, Scenario
+
+VERSION_KEY = 'catalogue-version'
+
+
+@dataclass(frozen=True)
+class ModuleRecord:
+    pk: int
+    title: str
+    slug: str
+    max_score: int
+    passing_score: int
+
+
+@dataclass(frozen=True)
+class ScenarioRecord:
+    pk: int
+    title: str
+    slug: str
+    time_limit: int
+
+
+@dataclass(frozen=True)
+class Catalogue:
+    version: int
+    modules: dict
+    scenarios: dict
+    modules_by_slug: dict
+    scenarios_by_slug: dict
+
+
+_catalogue = None
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def catalogue():
+    """The current ``Catalogue``, reloaded if another process changed a module or scenario."""
+    global _catalogue
+    version = versions.current(_cache(), VERSION_KEY)
+    current = _catalogue
+    if current is not None and current.version == version:
+        return current
+    # The version is read before the rows, so rows older than it are never
+    # kept under it: an edit committing meanwhile bumps it again
+    modules = {
+        row['pk']: ModuleRecord(**row)
+        for row in Module.objects.using(DEFAULT_DB_ALIAS).order_by('pk')
+        .values('pk', 'title', 'slug', 'max_score', 'passing_score')
+    }
+    scenarios = {
+        row['pk']: ScenarioRecord(**row)
+        for row in Scenario.objects.using(DEFAULT_DB_ALIAS).order_by('pk').values('pk', 'title', 'slug', 'time_limit')
+    }
+    current = Catalogue(
+        version=version,
+        modules=modules,
+        scenarios=scenarios,
+        modules_by_slug={record.slug: record for record in modules.values()},
+        scenarios_by_slug={record.slug: record for record in scenarios.values()},
+    )
+    with _lock:
+        _catalogue = current
+    return current
+
+
+def modules():
+    """Every module as a ``ModuleRecord``, keyed by primary key."""
+    return catalogue().modules
+
+
+def scenarios():
+    """Every scenario as a ``ScenarioRecord``, keyed by primary key."""
+    return catalogue().scenarios
+
+
+def item_count():
+    """Number of modules and scenarios a trainee can complete."""
+    current = catalogue()
+    return len(current.modules) + len(current.scenarios)
+
+
+def module_or_404(slug):
+    try:
+        return catalogue().modules_by_slug[slug]
+    except KeyError:
+        raise Http404(f"No module '{slug}'.")
+
+
+def scenario_or_404(slug):
+    try:
+        return catalogue().scenarios_by_slug[slug]
+    except KeyError:
+        raise Http404(f"No scenario '{slug}'.")
+
+
+def module_slugs(module_ids):
+    """The slugs of the modules with the given ids."""
+    current = modules()
+    return {current[pk].slug for pk in module_ids if pk in current}
+
+
+def invalidate_catalogue():
+    """Bump the catalogue version now and again once the current transaction commits.
+
+    The first bump lets the transaction see its own edits, the second
+    discards anything another process loaded before the commit.
+    """
+    def bump():
+        versions.bump(_cache(), VERSION_KEY)
+    bump()
+    transaction.on_commit(bump)
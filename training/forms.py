@@ -1,19 +1,27 @@
 # Add this to your forms.py file
 from django import forms
+from django.core.validators import MaxValueValidator
+
+# Longest attempt we accept, in seconds; anything above is not a real attempt
+MAX_TIME_SPENT = 24 * 60 * 60
 
 class QuizScoreForm(forms.Form):
-    score = forms.IntegerField(widget=forms.HiddenInput())
-    time_spent = forms.IntegerField(widget=forms.HiddenInput(), required=False)
+    score = forms.IntegerField(widget=forms.HiddenInput(), min_value=0)
+    time_spent = forms.IntegerField(widget=forms.HiddenInput(), required=False, min_value=0, max_value=MAX_TIME_SPENT)
     module_slug = forms.CharField(widget=forms.HiddenInput())
     
-    def __init__(self, *args, module_slug=None, **kwargs):
+    def __init__(self, *args, module_slug=None, max_score=None, **kwargs):
         super().__init__(*args, **kwargs)
         if module_slug:
             self.fields['module_slug'].initial = module_slug
+        if max_score is not None:
+            self.fields['score'].max_value = max_score
+            self.fields['score'].validators.append(MaxValueValidator(max_score))
 
 class ScenarioScoreForm(forms.Form):
-    score = forms.IntegerField(widget=forms.HiddenInput())
-    time_spent = forms.IntegerField(widget=forms.HiddenInput(), required=False)
+    # Scenarios are marked out of 100, see the Scenario model
+    score = forms.IntegerField(widget=forms.HiddenInput(), min_value=0, max_value=100)
+    time_spent = forms.IntegerField(widget=forms.HiddenInput(), required=False, min_value=0, max_value=MAX_TIME_SPENT)
     scenario_slug = forms.CharField(widget=forms.HiddenInput())
     
     def __init__(self, *args, scenario_slug=None, **kwargs):
@@ -0,0 +1,60 @@
+"""Manifest of the responsive image variants written by ``manage.py build_images``.
+
+The manifest maps each source image, relative to its static directory, to
+its size and the content-hashed variants built for every format and width::
+
+    {"Images/burns_1.png": {
+        "source": "Images/burns_1.png", "source_hash": "...", "bytes": 3311045,
+        "width": 2048, "height": 1152,
+        "variants": {"avif": [[640, "optimized/Images/burns_1-640.1a2b3c4d5e.avif", 20411], ...],
+                     "webp": [...]}}}
+"""
+import json
+import threading
+
+from django.conf import settings
+
+MANIFEST_NAME = 'manifest.json'
+
+_manifest = ({}, {}, None)
+_lock = threading.Lock()
+
+
+def manifest_path():
+    return settings.IMAGE_OUTPUT_DIR / MANIFEST_NAME
+
+
+def read_manifest():
+    """The manifest as a dict, empty when no build has run."""
+    try:
+        return json.loads(manifest_path().read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def manifest_version():
+    """Modification time of the manifest, ``None`` before the first build."""
+    try:
+        return manifest_path().stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def lookup(path):
+    """The manifest entry for a static ``path``, or ``None``.
+
+    Matching ignores case: templates written on case-insensitive file
+    systems refer to ``Images/`` as ``images/``.
+    """
+    global _manifest
+    mtime = manifest_version()
+    if mtime is None:
+        return None
+    entries, by_lower_path, loaded_mtime = _manifest
+    if loaded_mtime != mtime:
+        # Reread after every build, the file is replaced atomically
+        entries = read_manifest()
+        by_lower_path = {key.lower(): entry for key, entry in entries.items()}
+        with _lock:
+            _manifest = (entries, by_lower_path, mtime)
+    return entries.get(path) or by_lower_path.get(path.lower())
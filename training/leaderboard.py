@@ -0,0 +1,168 @@
+from django.db.models import Sum, Count, Q, Case, When, Value, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from django.core.paginator import Paginator
+
+from .models import UserModuleProgress, UserScenarioProgress, UserScore
+
+
+def level_for(completed_modules):
+    # Level is based on completed modules only
+    if completed_modules >= 8:
+        return "Expert"
+    elif completed_modules >= 5:
+        return "Advanced"
+    elif completed_modules >= 2:
+        return "Intermediate"
+    return "Beginner"
+
+
+def refresh_user_score(user_id, create=True):
+    """Recompute one user's ``UserScore`` row from their progress rows.
+
+    Only the rows of a single user are aggregated (at most one per module and
+    scenario, found through the ``unique_together`` index), so the cost does
+    not grow with the number of trainees. With ``create=False`` a missing row
+    is left alone, which is what cascading user deletes need.
+
+    Returns ``(score, changed)`` where ``changed`` is the set of counter
+    names whose value moved.
+    """
+    modules = UserModuleProgress.objects.filter(user_id=user_id).aggregate(
+        points=Coalesce(Sum('score'), 0),
+        done=Count('pk', filter=Q(completed=True)),
+        quick=Count('pk', filter=Q(completed=True, time_spent__lt=30)),
+        perfect=Count('pk', filter=Q(completed=True, score=100)),
+    )
+    scenarios = UserScenarioProgress.objects.filter(user_id=user_id).aggregate(
+        points=Coalesce(Sum('score'), 0),
+        done=Count('pk', filter=Q(completed=True)),
+    )
+    values = {
+        'total_points': modules['points'] + scenarios['points'],
+        'completed_modules': modules['done'],
+        'completed_scenarios': scenarios['done'],
+        'quick_completions': modules['quick'],
+        'perfect_scores': modules['perfect'],
+        'level': level_for(modules['done']),
+    }
+
+    score = UserScore.objects.filter(user_id=user_id).first()
+    if score is None:
+        if not create:
+            return None, set()
+        score, _ = UserScore.objects.get_or_create(user_id=user_id, defaults=values)
+        return score, set(values)
+
+    changed = {field for field, value in values.items() if getattr(score, field) != value}
+    if changed:
+        for field in changed:
+            setattr(score, field, values[field])
+        score.save(update_fields=changed)
+    return score, changed
+
+
+def per_user(model, aggregate, **filters):
+    # Correlated subquery aggregating ``model`` rows for the outer row's user
+    return Coalesce(Subquery(
+        model.objects.filter(user=OuterRef('user'), **filters)
+        .order_by().values('user')
+        .annotate(total=aggregate).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def rebuild_user_scores(users):
+    """Set-based ``refresh_user_score`` for every user in the ``users`` queryset.
+
+    Runs a fixed number of statements regardless of how many users are
+    passed, which is what bulk maintenance commands want.
+    """
+    UserScore.objects.bulk_create(
+        [UserScore(user_id=pk) for pk in users.filter(score__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    scores = UserScore.objects.filter(user__in=users)
+    scores.update(
+        total_points=per_user(UserModuleProgress, Sum('score')) + per_user(UserScenarioProgress, Sum('score')),
+        completed_modules=per_user(UserModuleProgress, Count('pk'), completed=True),
+        completed_scenarios=per_user(UserScenarioProgress, Count('pk'), completed=True),
+        quick_completions=per_user(UserModuleProgress, Count('pk'), completed=True, time_spent__lt=30),
+        perfect_scores=per_user(UserModuleProgress, Count('pk'), completed=True, score=100),
+    )
+    # SET clauses see the old row, so the level needs its own pass
+    scores.update(level=Case(
+        When(completed_modules__gte=8, then=Value("Expert")),
+        When(completed_modules__gte=5, then=Value("Advanced")),
+        When(completed_modules__gte=2, then=Value("Intermediate")),
+        default=Value("Beginner"),
+    ))
+
+
+def ranked_scores():
+    # Served straight from the (-total_points, user) index
+    return UserScore.objects.select_related('user').order_by('-total_points', 'user_id')
+
+
+def rank_of(score):
+    # Number of trainees with strictly more points, plus one
+    return UserScore.objects.filter(total_points__gt=score.total_points).count() + 1
+
+
+def next_rank_points(score):
+    # Points needed to overtake the closest trainee with a higher total
+    next_points = (
+        UserScore.objects.filter(total_points__gt=score.total_points)
+        .order_by('total_points')
+        .values_list('total_points', flat=True)
+        .first()
+    )
+    return (next_points - score.total_points) if next_points is not None else 0
+
+
+def _ahead_of(score):
+    # Rows ordered before ``score`` by the leaderboard ordering
+    return Q(total_points__gt=score.total_points) | Q(total_points=score.total_points, user_id__lt=score.user_id)
+
+
+def _ranked_entries(scores, first_position):
+    """Turn consecutive ranked rows into entries, tied totals share a rank.
+
+    ``first_position`` is the 1-based position of ``scores[0]`` in the full
+    ordering; only the first row needs a rank query of its own.
+    """
+    entries = []
+    rank = rank_of(scores[0]) if scores else 0
+    previous_points = None
+    for offset, score in enumerate(scores):
+        if previous_points is not None and score.total_points != previous_points:
+            rank = first_position + offset
+        previous_points = score.total_points
+        entries.append({
+            'rank': rank,
+            'user': score.user,
+            'total_points': score.total_points,
+            'completed_modules': score.completed_modules,
+            'level': score.level,
+        })
+    return entries
+
+
+def leaderboard_page(page_number, per_page):
+    """Return ``(page, entries)`` for one page of the leaderboard."""
+    page = Paginator(ranked_scores(), per_page).get_page(page_number)
+    scores = list(page.object_list)
+    return page, _ranked_entries(scores, page.start_index())
+
+
+def leaderboard_window(score, size):
+    """Entries for up to ``size`` trainees either side of ``score``, itself included.
+
+    Like the other helpers here, ``score`` only needs ``user_id`` and
+    ``total_points``, so a ``UserStats`` works as well as a ``UserScore``.
+    """
+    above = list(ranked_scores().filter(_ahead_of(score)).order_by('total_points', '-user_id')[:size])
+    from_here = list(ranked_scores().exclude(_ahead_of(score))[:size + 1])
+    scores = above[::-1] + from_here
+    first_position = UserScore.objects.filter(_ahead_of(scores[0])).count() + 1
+    return _ranked_entries(scores, first_position)
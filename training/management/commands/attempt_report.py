@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from training import catalogue
+from training.analytics import learning_curve, module_attempt_series, scenario_attempt_series
+
+
+class Command(BaseCommand):
+    help = (
+        "Report attempts at a module or scenario from the attempt log: statistics per day, week or "
+        "month and, for modules, the learning curve of the trainees who started in the range."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help="Module or scenario slug.")
+        parser.add_argument('--days', type=int, default=30, help="Report the last N days (default: 30).")
+        parser.add_argument('--period', choices=('day', 'week', 'month'), default='day')
+        parser.add_argument(
+            '--max-attempts', type=int, default=10,
+            help="Attempts per trainee in the learning curve (default: 10).",
+        )
+
+    def handle(self, *args, slug, days, period, max_attempts, **options):
+        current = catalogue.catalogue()
+        module = current.modules_by_slug.get(slug)
+        scenario = current.scenarios_by_slug.get(slug)
+        if module is None and scenario is None:
+            raise CommandError(f"No module or scenario '{slug}'.")
+        end = timezone.now()
+        start = end - timedelta(days=days)
+
+        if module is not None:
+            series = module_attempt_series(module, start, end, period)
+        else:
+            series = scenario_attempt_series(scenario, start, end, period)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{(module or scenario).title}, per {period}"))
+        if not series:
+            self.stdout.write("  No attempts.")
+        for row in series:
+            self.stdout.write(
+                f"  {row['period']:%Y-%m-%d}  {row['attempts']:6} attempts  {row['trainees']:5} trainees  "
+                f"avg {row['avg_score']:5.1f}  best {row['best_score']:3}  passed {row['passed']:5}"
+            )
+
+        if module is not None:
+            self.stdout.write(self.style.MIGRATE_HEADING("Learning curve"))
+            curve = learning_curve(module, start, end, max_attempts)
+            if not curve:
+                self.stdout.write("  No trainees started in the range.")
+            for number, average, trainees in curve:
+                self.stdout.write(f"  attempt {number:2}  avg {average:5.1f}  {trainees:5} trainees")
@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from training import versions
+from training.achievements import RULES
+from training.leaderboard import rebuild_user_scores
+from training.models import Achievement, UserAchievement, UserScore
+from training.stats import invalidate_user_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Award every achievement rule to all users who already qualify for it. Running workers only "
+        "see the change at once when STATS_CACHE_ALIAS is a cache shared between processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Number of users evaluated per batch (default: 5000).",
+        )
+        parser.add_argument(
+            '--rebuild-scores', action='store_true',
+            help="Recompute the UserScore counters from the progress tables first.",
+        )
+
+    def handle(self, *args, chunk_size, rebuild_scores, **options):
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be a positive integer.")
+
+        achievements = {a.title: a for a in Achievement.objects.filter(title__in=[r.title for r in RULES])}
+        rules = [rule for rule in RULES if rule.title in achievements]
+        for rule in RULES:
+            if rule.title not in achievements:
+                self.stdout.write(self.style.WARNING(f"Skipping '{rule.title}': no Achievement row with that title."))
+
+        total_users = User.objects.count()
+        processed = unlocked = 0
+        started = time.monotonic()
+        last_id = 0
+
+        while True:
+            # Keyset pagination keeps every batch an index range scan
+            user_ids = list(
+                User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            first_id, last_id = user_ids[0], user_ids[-1]
+
+            if rebuild_scores:
+                rebuild_user_scores(User.objects.filter(pk__gte=first_id, pk__lte=last_id))
+
+            new_unlocks = []
+            for rule in rules:
+                achievement = achievements[rule.title]
+                qualifying = (
+                    UserScore.objects.filter(rule.as_q(), user_id__gte=first_id, user_id__lte=last_id)
+                    .exclude(user__achievements__achievement=achievement)
+                    .values_list('user_id', flat=True)
+                )
+                new_unlocks.extend(UserAchievement(user_id=pk, achievement=achievement) for pk in qualifying)
+            UserAchievement.objects.bulk_create(new_unlocks, batch_size=1000, ignore_conflicts=True)
+            stale = user_ids if rebuild_scores else {unlock.user_id for unlock in new_unlocks}
+            for user_id in stale:
+                invalidate_user_stats(user_id)
+
+            processed += len(user_ids)
+            unlocked += len(new_unlocks)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"{processed}/{total_users} users, {unlocked} unlocks "
+                f"({processed / elapsed:.0f} users/s)"
+            )
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f"Evaluated {len(rules)} rules for {processed} users in {elapsed:.2f}s: "
+            f"{unlocked} achievements unlocked "
+            f"({processed / elapsed:.0f} users/s, {unlocked / elapsed:.0f} unlocks/s)."
+        ))
+        if (unlocked or rebuild_scores) and not versions.is_shared(caches[settings.STATS_CACHE_ALIAS]):
+            self.stdout.write(self.style.WARNING(
+                f"The '{settings.STATS_CACHE_ALIAS}' cache is local to each process: running workers keep "
+                f"showing the stats they cached until those expire. Restart them, or point the cache at a "
+                f"shared backend."
+            ))
@@ -0,0 +1,163 @@
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from training.leaderboard import leaderboard_page
+from training.models import Module, UserScore
+from training.progress import submit_quiz_score
+
+from .loadtest import create_scratch_database
+
+PROFILES = ('default', 'performance')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent quiz submissions through training.progress on a scratch copy of the "
+        "database, with the 'default' and the 'performance' DATABASE_PROFILE."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Threads submitting quizzes (default: 8).")
+        parser.add_argument('--readers', type=int, default=4, help="Threads reading the leaderboard (default: 4).")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per profile (default: 5).")
+        parser.add_argument('--users', type=int, default=1000, help="Trainees in the scratch database (default: 1000).")
+        parser.add_argument('--output', help="Also write the results as JSON to this file.")
+        parser.add_argument(
+            '--profile', choices=PROFILES,
+            help="Measure only the profile this process was started with and print the result as JSON.",
+        )
+
+    def handle(self, *args, writers, readers, duration, users, output, profile, **options):
+        if profile:
+            # The profile is read from the environment when settings load
+            if profile != settings.DATABASE_PROFILE:
+                raise CommandError(f"Run with DATABASE_PROFILE={profile} to measure it.")
+            self.stdout.write(json.dumps(self._measure(writers, readers, duration, users)))
+            return
+
+        results = {}
+        for name in PROFILES:
+            # Connection options and pragmas are fixed per process, so each profile gets its own
+            child = subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_sqlite', '--profile', name,
+                 '--writers', str(writers), '--readers', str(readers), '--duration', str(duration),
+                 '--users', str(users)],
+                env={**os.environ, 'DATABASE_PROFILE': name}, capture_output=True, text=True,
+            )
+            if child.returncode:
+                raise CommandError(f"The '{name}' run failed:\n{child.stderr}")
+            results[name] = json.loads(child.stdout)
+            self._report(name, results[name])
+
+        before, after = results['default'], results['performance']
+        if before['submissions_per_s']:
+            self.stdout.write(self.style.SUCCESS(
+                f"performance/default throughput: {after['submissions_per_s'] / before['submissions_per_s']:.2f}x"
+            ))
+        if output:
+            Path(output).write_text(json.dumps(results, indent=2))
+
+    def _measure(self, writers, readers, duration, users):
+        with tempfile.TemporaryDirectory() as tmp:
+            old_name = create_scratch_database(Path(tmp) / 'bench.sqlite3')
+            try:
+                user_ids = self._seed(users)
+                return self._run(user_ids, list(Module.objects.all()), writers, readers, duration)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _seed(self, count):
+        User.objects.bulk_create(
+            [User(username=f'bench{n}', password='!') for n in range(count)], batch_size=2000,
+        )
+        user_ids = list(User.objects.filter(username__startswith='bench').values_list('pk', flat=True))
+        UserScore.objects.bulk_create([UserScore(user_id=pk) for pk in user_ids], batch_size=2000)
+        return user_ids
+
+    def _run(self, user_ids, modules, writers, readers, duration):
+        stop = threading.Event()
+        lock = threading.Lock()
+        latencies, errors = [], {'locked': 0, 'other': 0}
+        reads = [0]
+
+        def writer(seed):
+            rng = random.Random(seed)
+            try:
+                while not stop.is_set():
+                    user = User(pk=rng.choice(user_ids))
+                    started = time.perf_counter()
+                    try:
+                        # The write path the quiz view takes
+                        submit_quiz_score(user, rng.choice(modules), rng.randint(0, 100), rng.randint(10, 300))
+                        with lock:
+                            latencies.append(time.perf_counter() - started)
+                    except OperationalError as exc:
+                        with lock:
+                            errors['locked' if 'locked' in str(exc) else 'other'] += 1
+                    finally:
+                        # What the end of a request does: close, unless CONN_MAX_AGE keeps it
+                        close_old_connections()
+            finally:
+                connection.close()
+
+        def reader():
+            try:
+                while not stop.is_set():
+                    try:
+                        list(leaderboard_page(None, settings.LEADERBOARD_PAGE_SIZE)[1])
+                        with lock:
+                            reads[0] += 1
+                    except OperationalError:
+                        pass
+                    finally:
+                        close_old_connections()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+        return {
+            'submissions': len(latencies),
+            'submissions_per_s': len(latencies) / elapsed,
+            'reads_per_s': reads[0] / elapsed,
+            'locked_errors': errors['locked'],
+            'other_errors': errors['other'],
+            'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+        }
+
+    def _report(self, name, result):
+        self.stdout.write(
+            f"{name:>12}: {result['submissions_per_s']:8.1f} submissions/s, {result['reads_per_s']:8.1f} reads/s, "
+            f"p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms, p99 {result['p99_ms']:.1f}ms, "
+            f"{result['locked_errors']} 'database is locked' errors"
+        )
@@ -0,0 +1,145 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from training.images import manifest_path, read_manifest
+
+SOURCE_SUFFIXES = {'.png', '.jpg', '.jpeg'}
+
+
+def _size(count):
+    return f"{count / 1024:.0f} KB" if count < 1024 * 1024 else f"{count / 1024 / 1024:.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Build content-hashed WebP/AVIF variants of the PNG and JPEG images in STATICFILES_DIRS "
+        "at each of IMAGE_WIDTHS, and report the bytes saved per image. Requires Pillow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--widths', type=int, nargs='+',
+            help="Widths to build, overriding IMAGE_WIDTHS. Images are never upscaled.",
+        )
+        parser.add_argument(
+            '--formats', nargs='+',
+            help="Formats to build, overriding the keys of IMAGE_FORMATS (avif, webp).",
+        )
+        parser.add_argument('--force', action='store_true', help="Rebuild images that have not changed.")
+
+    def handle(self, *args, widths, formats, force, **options):
+        try:
+            from PIL import Image, features
+        except ImportError:
+            raise CommandError("build_images needs Pillow: pip install Pillow")
+
+        widths = sorted(widths or settings.IMAGE_WIDTHS)
+        qualities = {name: settings.IMAGE_FORMATS.get(name, 80) for name in formats or settings.IMAGE_FORMATS}
+        for name in list(qualities):
+            if not features.check(name):
+                self.stdout.write(self.style.WARNING(f"Skipping {name}: this Pillow build cannot write it."))
+                del qualities[name]
+        if not qualities:
+            raise CommandError("No image format left to build.")
+
+        output_dir = Path(settings.IMAGE_OUTPUT_DIR)
+        static_root = output_dir.parent
+        old_manifest = read_manifest()
+        manifest = {}
+        total_before = total_after = 0
+
+        for static_dir in map(Path, settings.STATICFILES_DIRS):
+            for source in sorted(static_dir.rglob('*')):
+                if source.suffix.lower() not in SOURCE_SUFFIXES or output_dir in source.parents:
+                    continue
+                key = source.relative_to(static_dir).as_posix()
+                data = source.read_bytes()
+                source_hash = hashlib.sha256(data).hexdigest()[:16]
+
+                entry = old_manifest.get(key)
+                if force or not self._is_current(entry, source_hash, widths, qualities, static_root):
+                    entry = self._build(Image, source, key, data, source_hash, widths, qualities,
+                                        output_dir, static_root)
+                manifest[key] = entry
+
+                # What a full-width desktop view downloads, in the preferred format
+                best_format = next(iter(qualities))
+                after = entry['variants'][best_format][-1][2]
+                total_before += entry['bytes']
+                total_after += after
+                self.stdout.write(
+                    f"{key}: {_size(entry['bytes'])} -> {_size(after)} {best_format} "
+                    f"at {entry['variants'][best_format][-1][0]}px ({after / entry['bytes'] - 1:+.0%})"
+                )
+
+        self._remove_stale(old_manifest, manifest, static_root)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest_path().with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+        os.replace(tmp_path, manifest_path())
+
+        if total_before:
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(manifest)} images: {_size(total_before)} -> {_size(total_after)} "
+                f"({total_after / total_before - 1:+.0%}), manifest in {manifest_path()}"
+            ))
+
+    def _is_current(self, entry, source_hash, widths, qualities, static_root):
+        if not entry or entry['source_hash'] != source_hash or set(entry['variants']) != set(qualities):
+            return False
+        if entry.get('widths') != widths:
+            return False
+        return all(
+            (static_root / path).exists()
+            for variants in entry['variants'].values() for _, path, _ in variants
+        )
+
+    def _build(self, Image, source, key, data, source_hash, widths, qualities, output_dir, static_root):
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+            width, height = image.size
+            # Never upscale; the widest variant is the original width when it is smaller than the largest width
+            targets = sorted({min(target, width) for target in widths})
+
+            variants = {}
+            for name, quality in qualities.items():
+                variants[name] = []
+                for target in targets:
+                    resized = image if target == width else image.resize(
+                        (target, max(1, round(height * target / width))), Image.Resampling.LANCZOS,
+                    )
+                    buffer = io.BytesIO()
+                    resized.save(buffer, format=name.upper(), quality=quality)
+                    encoded = buffer.getvalue()
+                    digest = hashlib.sha256(encoded).hexdigest()[:10]
+                    path = output_dir / Path(key).parent / f"{source.stem}-{target}.{digest}.{name}"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(encoded)
+                    variants[name].append([target, path.relative_to(static_root).as_posix(), len(encoded)])
+
+        return {
+            'source': key,
+            'source_hash': source_hash,
+            'bytes': len(data),
+            'width': width,
+            'height': height,
+            'widths': widths,
+            'variants': variants,
+        }
+
+    def _remove_stale(self, old_manifest, manifest, static_root):
+        current = {path for entry in manifest.values() for variants in entry['variants'].values()
+                   for _, path, _ in variants}
+        for entry in old_manifest.values():
+            for variants in entry['variants'].values():
+                for _, path, _ in variants:
+                    if path not in current:
+                        (static_root / path).unlink(missing_ok=True)
@@ -0,0 +1,234 @@
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from training.models import Module
+from training.views import QUIZ_LEARNING_PAGES
+
+FIXTURES = (
+    'addingdata.json', 'scenario_data.json', 'achievedata.json', 'questiondata.json', 'scenariograph.json',
+)
+
+
+def create_scratch_database(path):
+    """Migrate a new SQLite database at ``path`` with the fixtures loaded, and switch to it.
+
+    Returns the name to pass to ``destroy_test_db`` to switch back.
+    """
+    if connection.vendor != 'sqlite':
+        raise CommandError("The scratch database needs SQLite, use --live to run against this database.")
+    # A file rather than the in-memory test database, so that threads lock
+    # each other the way separate requests do
+    connection.settings_dict['TEST']['NAME'] = str(path)
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    for alias in settings.REPLICA_DATABASES:
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    call_command('loaddata', *(str(settings.BASE_DIR / name) for name in FIXTURES), verbosity=0)
+    return old_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate concurrent trainees going register -> login -> learning page -> quiz -> profile -> "
+        "leaderboard through the full Django stack, and report throughput, latency percentiles and "
+        "database lock waits per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Concurrent simulated trainees (default: 20).")
+        parser.add_argument(
+            '--rounds', type=int, default=5,
+            help="Learning page/quiz/profile/leaderboard rounds per trainee after logging in (default: 5).",
+        )
+        parser.add_argument(
+            '--slow-ms', type=float, default=100,
+            help="Count SQL statements slower than this as lock waits (default: 100).",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for module choice and scores.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--compare', help="A previous --output file to print the p95 change against.")
+        parser.add_argument(
+            '--live', action='store_true',
+            help="Run against the configured database instead of a scratch copy. Leaves the trainees behind.",
+        )
+
+    def handle(self, *args, users, rounds, slow_ms, seed, output, compare, live, **options):
+        if users < 1 or rounds < 1:
+            raise CommandError("--users and --rounds must be positive integers.")
+
+        setup_test_environment(debug=False)
+        old_name = None
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                if not live:
+                    old_name = create_scratch_database(Path(tmp) / 'loadtest.sqlite3')
+                try:
+                    results = self._run(users, rounds, slow_ms / 1000, random.Random(seed))
+                finally:
+                    if old_name is not None:
+                        connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+
+        results['meta'] = {
+            'users': users,
+            'rounds': rounds,
+            'database_profile': settings.DATABASE_PROFILE,
+            'submission_mode': settings.SUBMISSION_MODE,
+            'commit': self._commit(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        }
+        self._report(results, compare)
+        if output:
+            Path(output).write_text(json.dumps(results, indent=2))
+
+    def _run(self, users, rounds, slow_seconds, rng):
+        slugs = [slug for slug in Module.objects.values_list('slug', flat=True) if slug in QUIZ_LEARNING_PAGES]
+        if not slugs:
+            raise CommandError("No quiz modules in the database.")
+        run_id = f'{time.time_ns():x}'[-8:]
+        # Seeds are drawn up front so the run does not depend on thread scheduling
+        seeds = [rng.randrange(2 ** 32) for _ in range(users)]
+
+        lock = threading.Lock()
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        lock_errors = defaultdict(int)
+        slow_statements = defaultdict(int)
+        barrier = threading.Barrier(users + 1)
+
+        def trainee(number):
+            local = threading.local()
+            local.endpoint = None
+            user_rng = random.Random(seeds[number])
+
+            def watch_statements(execute, sql, params, many, context):
+                started = time.perf_counter()
+                try:
+                    return execute(sql, params, many, context)
+                except OperationalError as exc:
+                    if 'locked' in str(exc):
+                        with lock:
+                            lock_errors[local.endpoint] += 1
+                    raise
+                finally:
+                    if time.perf_counter() - started > slow_seconds:
+                        with lock:
+                            slow_statements[local.endpoint] += 1
+
+            def request(endpoint, method, url, data=None):
+                local.endpoint = endpoint
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    timings[endpoint].append(elapsed)
+                    if response.status_code >= 400:
+                        errors[endpoint] += 1
+
+            client = Client(raise_request_exception=False)
+            username = f'loadtest-{run_id}-{number}'
+            credentials = {'username': username, 'password': 'load-test-password'}
+            barrier.wait()
+            try:
+                with connection.execute_wrapper(watch_statements):
+                    request('register', 'post', reverse('register'),
+                            {**credentials, 'confirm_password': credentials['password']})
+                    client.logout()
+                    request('login', 'post', reverse('login'), credentials)
+                    for _ in range(rounds):
+                        slug = user_rng.choice(slugs)
+                        request('learning', 'get', reverse(QUIZ_LEARNING_PAGES[slug]))
+                        request('quiz', 'post', reverse('quiz', kwargs={'slug': slug}), {
+                            'score': user_rng.randint(0, 100),
+                            'time_spent': user_rng.randint(10, 300),
+                            'module_slug': slug,
+                        })
+                        request('profile', 'get', reverse('profile'))
+                        request('leaderboard', 'get', reverse('leaderboard'))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=trainee, args=(number,)) for number in range(users)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        endpoints = {}
+        for endpoint, samples in timings.items():
+            samples.sort()
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': errors[endpoint],
+                'lock_errors': lock_errors[endpoint],
+                'slow_statements': slow_statements[endpoint],
+                'mean_ms': statistics.fmean(samples) * 1000,
+                'p50_ms': self._percentile(samples, 0.50),
+                'p95_ms': self._percentile(samples, 0.95),
+                'p99_ms': self._percentile(samples, 0.99),
+                'max_ms': samples[-1] * 1000,
+            }
+        total_requests = sum(len(samples) for samples in timings.values())
+        return {
+            'elapsed_s': elapsed,
+            'requests': total_requests,
+            'requests_per_s': total_requests / elapsed,
+            'quiz_submissions_per_s': len(timings['quiz']) / elapsed,
+            'endpoints': endpoints,
+        }
+
+    @staticmethod
+    def _percentile(samples, fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _report(self, results, compare):
+        previous = json.loads(Path(compare).read_text())['endpoints'] if compare else {}
+        self.stdout.write(
+            f"{results['requests']} requests in {results['elapsed_s']:.2f}s: "
+            f"{results['requests_per_s']:.1f} requests/s, "
+            f"{results['quiz_submissions_per_s']:.1f} quiz submissions/s"
+        )
+        self.stdout.write(
+            f"{'endpoint':<12} {'requests':>8} {'errors':>6} {'locked':>6} {'slow sql':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for endpoint, row in results['endpoints'].items():
+            line = (
+                f"{endpoint:<12} {row['requests']:>8} {row['errors']:>6} {row['lock_errors']:>6} "
+                f"{row['slow_statements']:>8} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+            )
+            if endpoint in previous:
+                change = row['p95_ms'] / previous[endpoint]['p95_ms'] - 1 if previous[endpoint]['p95_ms'] else 0
+                line += f"  p95 {change:+.0%}"
+            style = self.style.ERROR if row['errors'] else (lambda text: text)
+            self.stdout.write(style(line))
@@ -0,0 +1,57 @@
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from training.profiling import SUFFIX
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the collapsed stacks sampled by training.profiling into one file, "
+        "ready for flamegraph.pl or speedscope."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help="URL names to include, e.g. leaderboard or admin:index. All views by default.",
+        )
+        parser.add_argument('--output', '-o', help="File to write. Standard output by default.")
+        parser.add_argument(
+            '--prefix-view', action='store_true',
+            help="Start every stack with its view's name, so one flamegraph compares views.",
+        )
+        parser.add_argument(
+            '--current-only', action='store_true', help="Leave out the rotated files.",
+        )
+
+    def handle(self, *args, views, output, prefix_view, current_only, **options):
+        directory = Path(settings.PROFILING['DIR'])
+        wanted = {view.replace(':', '.') for view in views}
+        stacks = Counter()
+        samples_by_view = Counter()
+        for path in sorted(directory.glob(f'*{SUFFIX}*')):
+            view, _, rotation = path.name.partition(SUFFIX)
+            if (wanted and view not in wanted) or (rotation and (current_only or not rotation[1:].isdigit())):
+                continue
+            with open(path, encoding='utf-8') as profile:
+                for line in profile:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if not stack or not count.isdigit():
+                        # Cut short by a rotation or a crashed worker
+                        continue
+                    stacks[f'{view};{stack}' if prefix_view else stack] += int(count)
+                    samples_by_view[view] += int(count)
+        if not stacks:
+            raise CommandError(f"No profiles found in {directory}.")
+
+        lines = ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+        if output:
+            Path(output).write_text(lines, encoding='utf-8')
+        else:
+            self.stdout.write(lines, ending='')
+        # The summary goes to stderr so it stays out of piped output
+        for view, count in samples_by_view.most_common():
+            self.stderr.write(f"{count:>8} samples  {view}")
@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = {
+    'total': lambda group: group['total_ms'],
+    'max': lambda group: group['slowest']['duration_ms'],
+    'count': lambda group: group['count'],
+}
+
+
+def _where(frame):
+    return f"{frame['file']}:{frame['line']} in {frame['function']}" if frame else "outside any view"
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise the slow-query log written by training.slowqueries: the queries that cost the "
+        "most, grouped by query and by the view line that ran them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help="Log file to read. SLOW_QUERY_LOG by default.")
+        parser.add_argument('--top', type=int, default=10, help="Number of queries to show (default: 10).")
+        parser.add_argument(
+            '--sort', choices=sorted(SORT_KEYS), default='total',
+            help="Rank by total time (default), slowest run, or number of runs.",
+        )
+
+    def handle(self, *args, log, top, sort, **options):
+        if not (log or settings.SLOW_QUERY_LOG):
+            raise CommandError("No log to read, set SLOW_QUERY_LOG or pass --log.")
+        path = Path(log or settings.SLOW_QUERY_LOG)
+        if not path.is_file():
+            raise CommandError(f"No slow-query log at {path}.")
+
+        groups = {}
+        skipped = 0
+        with open(path, encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                    view = entry['view']
+                    key = (entry['fingerprint'], view and (view['file'], view['line']))
+                    duration_ms = entry['duration_ms']
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+                    continue
+                group = groups.setdefault(key, {'count': 0, 'total_ms': 0.0, 'slowest': entry})
+                group['count'] += 1
+                group['total_ms'] += duration_ms
+                if duration_ms > group['slowest']['duration_ms']:
+                    group['slowest'] = entry
+        if not groups:
+            raise CommandError(f"No slow queries logged in {path}.")
+
+        ranked = sorted(groups.values(), key=SORT_KEYS[sort], reverse=True)[:top]
+        for rank, group in enumerate(ranked, 1):
+            slowest = group['slowest']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank}  {group['total_ms']:.1f} ms total, {group['count']} run(s), "
+                f"avg {group['total_ms'] / group['count']:.1f} ms, max {slowest['duration_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  view:   {_where(slowest['view'])}")
+            if slowest['view']:
+                self.stdout.write(f"          {slowest['view']['code']}")
+            if slowest['caller'] and slowest['caller'] != slowest['view']:
+                self.stdout.write(f"  caller: {_where(slowest['caller'])}")
+                self.stdout.write(f"          {slowest['caller']['code']}")
+            self.stdout.write(f"  sql:    {slowest['sql']}")
+            self.stdout.write(f"  params: {json.dumps(slowest['params'])}")
+            for step in slowest['plan'] or []:
+                self.stdout.write(f"  plan:   {step}")
+            self.stdout.write('')
+        if skipped:
+            self.stderr.write(f"Skipped {skipped} unreadable line(s).")
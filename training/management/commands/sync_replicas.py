@@ -0,0 +1,42 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the SQLite files listed in DATABASE_REPLICAS, "
+        "standing in for replication when running with local replicas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Keep copying every INTERVAL seconds instead of once, simulating replication lag.",
+        )
+
+    def handle(self, *args, interval, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError("No replicas configured, set DATABASE_REPLICAS.")
+        for alias in [DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"'{alias}' is not an SQLite database; replicate it with its own tooling.")
+
+        while True:
+            started = time.monotonic()
+            # The backup API copies a consistent snapshot even while the primary is being written to
+            with closing(sqlite3.connect(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])) as primary:
+                for alias in settings.REPLICA_DATABASES:
+                    with closing(sqlite3.connect(connections[alias].settings_dict['NAME'])) as replica:
+                        primary.backup(replica)
+            self.stdout.write(
+                f"Copied the primary to {len(settings.REPLICA_DATABASES)} replica(s) "
+                f"in {time.monotonic() - started:.2f}s."
+            )
+            if not interval:
+                return
+            time.sleep(interval)
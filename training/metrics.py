@@ -0,0 +1,280 @@
+"""Per-view request metrics in Prometheus text format.
+
+``MetricsMiddleware`` times every request and records, per URL name, the
+wall time, the number of SQL queries and the time spent in them, the time
+spent rendering templates and the response size. Each is kept as a
+histogram in the worker process. With buffered submissions, the queue
+depth and flush latency of the worker's ``training.pipeline`` buffer are
+reported alongside.
+
+With ``METRICS_DIR`` set, every worker writes its totals to its own file
+there at most every ``METRICS_FLUSH_SECONDS`` and ``render_prometheus``
+adds up the files of all workers, so the ``metrics`` view reports the
+whole server whichever worker answers. Totals only grow, a file left by
+a stopped worker still counts; clear the directory when restarting the
+server to reset them. Without it each process reports only itself.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from .pipeline import buffer_metrics
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name: (help, buckets)
+HISTOGRAMS = {
+    'request_duration_seconds': ("Wall time of the request, middleware included.", SECONDS_BUCKETS),
+    'sql_queries': ("SQL queries run by the request.", (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)),
+    'sql_duration_seconds': ("Time spent executing SQL queries.", SECONDS_BUCKETS),
+    'template_duration_seconds': ("Time spent rendering templates.", SECONDS_BUCKETS),
+    'response_size_bytes': (
+        "Size of the response body, before compression.",
+        (1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    ),
+}
+# name: (type, help, key in SubmissionBuffer.metrics, scale); added up over workers, except *_max_*
+BUFFER_METRICS = {
+    'submission_queue_depth': ('gauge', "Submissions waiting to be written.", 'queue_depth', 1),
+    'submissions_enqueued_total': ('counter', "Submissions accepted by the buffer.", 'enqueued_total', 1),
+    'submissions_flushed_total': ('counter', "Submissions written by the buffer.", 'flushed_total', 1),
+    'submissions_failed_total': ('counter', "Submissions dropped after failing to write.", 'failed_total', 1),
+    'submission_flushes_total': ('counter', "Batches written by the buffer.", 'flush_count', 1),
+    'submission_flush_seconds_total': (
+        'counter', "Time spent writing batches.", 'total_flush_ms', 0.001,
+    ),
+    'submission_flush_max_seconds': ('gauge', "Slowest batch written.", 'max_flush_ms', 0.001),
+}
+PREFIX = 'training_'
+UNMATCHED = '<unmatched>'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request has spent so far."""
+    __slots__ = ('queries', 'sql_seconds', 'template_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+
+class Registry:
+    """Histograms and request counts, labelled by view, for one process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.requests = {}
+
+    def observe(self, view, status, values):
+        with self.lock:
+            key = f'{view}|{status}'
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self.histograms[name].setdefault(
+                    view, {'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0},
+                )
+                index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+                series['buckets'][index] += 1
+                series['sum'] += value
+                series['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps({'histograms': self.histograms, 'requests': self.requests}))
+
+
+registry = Registry()
+_process_file = None
+_flushed_at = 0.0
+_flush_lock = threading.Lock()
+
+
+def _process_snapshot():
+    snapshot = registry.snapshot()
+    snapshot['submission_buffer'] = buffer_metrics()
+    return snapshot
+
+
+def _metrics_dir():
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def flush(force=False):
+    """Write this process's totals to its file in ``METRICS_DIR``, at most every ``METRICS_FLUSH_SECONDS``."""
+    global _process_file, _flushed_at
+    directory = _metrics_dir()
+    if directory is None or (not force and time.monotonic() - _flushed_at < settings.METRICS_FLUSH_SECONDS):
+        return
+    with _flush_lock:
+        _flushed_at = time.monotonic()
+        if _process_file is None:
+            # Unique per process lifetime, so a recycled pid never overwrites a stopped worker's totals
+            _process_file = f'{socket.gethostname()}-{os.getpid()}-{time.time_ns()}.json'
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / _process_file
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(_process_snapshot()))
+        os.replace(tmp_path, path)
+
+
+def _merge(total, snapshot):
+    for name, series_by_view in snapshot['histograms'].items():
+        if name not in total['histograms']:
+            continue
+        for view, series in series_by_view.items():
+            merged = total['histograms'][name].setdefault(
+                view, {'buckets': [0] * len(series['buckets']), 'sum': 0, 'count': 0},
+            )
+            if len(merged['buckets']) != len(series['buckets']):
+                # Written with other bucket bounds by an older deploy
+                continue
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], series['buckets'])]
+            merged['sum'] += series['sum']
+            merged['count'] += series['count']
+    for key, count in snapshot['requests'].items():
+        total['requests'][key] = total['requests'].get(key, 0) + count
+    buffer = snapshot.get('submission_buffer')
+    if buffer:
+        merged = total['submission_buffer'] or {}
+        for _, _, key, _ in BUFFER_METRICS.values():
+            value = buffer.get(key, 0)
+            merged[key] = max(merged.get(key, 0), value) if key.startswith('max_') else merged.get(key, 0) + value
+        total['submission_buffer'] = merged
+
+
+def collect():
+    """Totals of every worker that wrote to ``METRICS_DIR``, or of this process alone without one."""
+    directory = _metrics_dir()
+    if directory is None:
+        return _process_snapshot()
+    flush(force=True)
+    total = {'histograms': {name: {} for name in HISTOGRAMS}, 'requests': {}, 'submission_buffer': None}
+    for path in sorted(directory.glob('*.json')):
+        try:
+            _merge(total, json.loads(path.read_text()))
+        except (OSError, ValueError, KeyError):
+            # Removed or half-written by a worker that is shutting down
+            continue
+    return total
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """All metrics, in the Prometheus text exposition format."""
+    totals = collect()
+    lines = [
+        f'# HELP {PREFIX}requests_total Requests served, by view and status code.',
+        f'# TYPE {PREFIX}requests_total counter',
+    ]
+    for key, count in sorted(totals['requests'].items()):
+        view, status = key.rsplit('|', 1)
+        lines.append(f'{PREFIX}requests_total{{view="{_label(view)}",status="{status}"}} {count}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for view, series in sorted(totals['histograms'][name].items()):
+            label = _label(view)
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], series['buckets']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{view="{label}"}} {series["sum"]}')
+            lines.append(f'{metric}_count{{view="{label}"}} {series["count"]}')
+
+    buffer = totals['submission_buffer']
+    if buffer:
+        for name, (kind, help_text, key, scale) in BUFFER_METRICS.items():
+            metric = PREFIX + name
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}', f'{metric} {buffer[key] * scale}']
+    return '\n'.join(lines) + '\n'
+
+
+def _time_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.sql_seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record the cost of every request in ``registry``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match and match.view_name else UNMATCHED
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        registry.observe(view, response.status_code, {
+            'request_duration_seconds': elapsed,
+            'sql_queries': metrics.queries,
+            'sql_duration_seconds': metrics.sql_seconds,
+            'template_duration_seconds': metrics.template_seconds,
+            'response_size_bytes': size,
+        })
+        flush()
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding render time to the request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def _subtotal(model, expression):
+    return Coalesce(Subquery(
+        model.objects.filter(user=OuterRef('pk'))
+        .order_by().values('user')
+        .annotate(total=expression).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def backfill_user_scores(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserModuleProgress = apps.get_model('training', 'UserModuleProgress')
+    UserScenarioProgress = apps.get_model('training', 'UserScenarioProgress')
+    UserScore = apps.get_model('training', 'UserScore')
+
+    users = User.objects.annotate(
+        module_points=_subtotal(UserModuleProgress, Sum('score')),
+        scenario_points=_subtotal(UserScenarioProgress, Sum('score')),
+        modules_done=_subtotal(UserModuleProgress, Count('pk', filter=Q(completed=True))),
+        scenarios_done=_subtotal(UserScenarioProgress, Count('pk', filter=Q(completed=True))),
+    ).values_list('pk', 'module_points', 'scenario_points', 'modules_done', 'scenarios_done')
+
+    def level_for(completed_modules):
+        if completed_modules >= 8:
+            return "Expert"
+        elif completed_modules >= 5:
+            return "Advanced"
+        elif completed_modules >= 2:
+            return "Intermediate"
+        return "Beginner"
+
+    UserScore.objects.bulk_create(
+        (
+            UserScore(
+                user_id=pk,
+                total_points=module_points + scenario_points,
+                completed_modules=modules_done,
+                completed_scenarios=scenarios_done,
+                level=level_for(modules_done),
+            )
+            for pk, module_points, scenario_points, modules_done, scenarios_done in users.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('training', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserScore',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_points', models.PositiveIntegerField(default=0)),
+                ('completed_modules', models.PositiveIntegerField(default=0)),
+                ('completed_scenarios', models.PositiveIntegerField(default=0)),
+                ('level', models.CharField(default='Beginner', max_length=20)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-total_points', 'user'], name='userscore_rank_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_user_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    UserModuleProgress = apps.get_model('training', 'UserModuleProgress')
+    UserScore = apps.get_model('training', 'UserScore')
+
+    def completed_modules(**filters):
+        return Coalesce(Subquery(
+            UserModuleProgress.objects.filter(user=OuterRef('user'), completed=True, **filters)
+            .order_by().values('user')
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ), 0)
+
+    UserScore.objects.update(
+        quick_completions=completed_modules(time_spent__lt=30),
+        perfect_scores=completed_modules(score=100),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0002_userscore'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userscore',
+            name='perfect_scores',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userscore',
+            name='quick_completions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0004_attempt_history'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='usermoduleprogress',
+            index=models.Index(fields=['user', 'completed', 'score', 'time_spent', 'module'], name='moduleprogress_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userscenarioprogress',
+            index=models.Index(fields=['user', 'completed', 'score'], name='scenarioprogress_user_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+import json
+from pathlib import Path
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A snapshot of questiondata.json as it was when this migration was written,
+# never edited so the migration loads the same rows on every database
+QUESTION_FIXTURE = Path(__file__).with_suffix('.json')
+
+
+def load_question_bank(apps, schema_editor):
+    # The questions used to live in the quiz templates; move them into
+    # every existing database so its quizzes keep working
+    Module = apps.get_model('training', 'Module')
+    Question = apps.get_model('training', 'Question')
+    Choice = apps.get_model('training', 'Choice')
+    modules = {module.slug: module for module in Module.objects.all()}
+    questions = {}
+    for row in json.loads(QUESTION_FIXTURE.read_text()):
+        fields = row['fields']
+        if row['model'] == 'training.question' and fields['module'][0] in modules:
+            key = (fields['module'][0], fields['order'])
+            questions[key] = Question.objects.create(
+                module=modules[key[0]], order=fields['order'],
+                text=fields['text'], explanation=fields['explanation'],
+            )
+        elif row['model'] == 'training.choice' and tuple(fields['question']) in questions:
+            Choice.objects.create(
+                question=questions[tuple(fields['question'])], order=fields['order'],
+                text=fields['text'], icon=fields['icon'], is_correct=fields['is_correct'],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0005_progress_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Question',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveSmallIntegerField()),
+                ('text', models.TextField()),
+                ('explanation', models.TextField(blank=True)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='training.module')),
+            ],
+            options={
+                'ordering': ['module', 'order'],
+                'unique_together': {('module', 'order')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Choice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveSmallIntegerField()),
+                ('text', models.CharField(max_length=200)),
+                ('icon', models.CharField(blank=True, help_text='Emoji shown next to the choice', max_length=16)),
+                ('is_correct', models.BooleanField(default=False)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choices', to='training.question')),
+            ],
+            options={
+                'ordering': ['question', 'order'],
+                'unique_together': {('question', 'order')},
+            },
+        ),
+        migrations.RunPython(load_question_bank, migrations.RunPython.noop),
+    ]
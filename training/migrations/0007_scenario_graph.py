@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:45
+
+import json
+from pathlib import Path
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# A snapshot of scenariograph.json as it was when this migration was written,
+# never edited so the migration loads the same rows on every database
+GRAPH_FIXTURE = Path(__file__).with_suffix('.json')
+TIME_LIMITS = {'burns_scenario': 60}
+
+
+def load_scenario_graphs(apps, schema_editor):
+    # The steps used to be hard-coded in the scenario templates; move them
+    # into every existing database so its scenarios keep working
+    Scenario = apps.get_model('training', 'Scenario')
+    ScenarioStep = apps.get_model('training', 'ScenarioStep')
+    ScenarioOption = apps.get_model('training', 'ScenarioOption')
+    scenarios = {scenario.slug: scenario for scenario in Scenario.objects.all()}
+    for slug, time_limit in TIME_LIMITS.items():
+        Scenario.objects.filter(slug=slug).update(time_limit=time_limit)
+
+    rows = json.loads(GRAPH_FIXTURE.read_text())
+    steps = {}
+    for row in rows:
+        fields = dict(row['fields'])
+        if row['model'] == 'training.scenariostep' and fields['scenario'][0] in scenarios:
+            scenario = scenarios[fields.pop('scenario')[0]]
+            steps[(scenario.slug, fields['key'])] = ScenarioStep.objects.create(scenario=scenario, **fields)
+    for row in rows:
+        fields = dict(row['fields'])
+        if row['model'] == 'training.scenariooption' and tuple(fields['step']) in steps:
+            ScenarioOption.objects.create(
+                step=steps[tuple(fields.pop('step'))], next_step=steps[tuple(fields.pop('next_step'))], **fields,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('training', '0006_question_bank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scenario',
+            name='time_limit',
+            field=models.PositiveSmallIntegerField(default=120, help_text='Seconds before the timeout step'),
+        ),
+        migrations.CreateModel(
+            name='ScenarioStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.SlugField()),
+                ('kind', models.CharField(choices=[('choice', 'Choose an option'), ('dial', 'Dial the emergency number'), ('wrap', 'Wrap a sprained joint'), ('heimlich', 'Abdominal thrusts')], default='choice', help_text='Challenges pick the option whose outcome matches how the trainee did', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0, help_text='Percent of the progress bar')),
+                ('speaker', models.CharField(default='Narrator', max_length=50)),
+                ('narration', models.TextField()),
+                ('heading', models.CharField(blank=True, max_length=200)),
+                ('image', models.CharField(blank=True, help_text='Static path of the background, blank keeps the last one', max_length=200)),
+                ('inset_image', models.CharField(blank=True, help_text='Static path of an image shown in the dialogue box', max_length=200)),
+                ('score', models.SmallIntegerField(blank=True, help_text='Score for ending the scenario here', null=True)),
+                ('scenario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='training.scenario')),
+            ],
+            options={
+                'unique_together': {('scenario', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ScenarioOption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveSmallIntegerField()),
+                ('text', models.CharField(blank=True, max_length=200)),
+                ('image', models.CharField(blank=True, help_text='Static path, shown instead of a button', max_length=200)),
+                ('outcome', models.CharField(blank=True, help_text='Challenge result that takes this option', max_length=20)),
+                ('score_delta', models.SmallIntegerField(default=0)),
+                ('next_step', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='training.scenariostep')),
+                ('step', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='options', to='training.scenariostep')),
+            ],
+            options={
+                'ordering': ['step', 'order'],
+                'unique_together': {('step', 'order')},
+            },
+        ),
+        migrations.RunPython(load_scenario_graphs, migrations.RunPython.noop),
+    ]
@@ -1,24 +1,177 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import timedelta
 
+class ModuleManager(models.Manager):
+    def get_by_natural_key(self, slug):
+        return self.get(slug=slug)
+
+
 class Module(models.Model):
     title = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     max_score = models.PositiveIntegerField(default=50)
     passing_score = models.PositiveIntegerField(default=60)
-    
+
+    objects = ModuleManager()
+
     def __str__(self):
         return self.title
+
+    def natural_key(self):
+        return (self.slug,)
+
+
+class QuestionManager(models.Manager):
+    def get_by_natural_key(self, module_slug, order):
+        return self.get(module__slug=module_slug, order=order)
+
+
+class Question(models.Model):
+    """One quiz question, shown in ``order`` within its module's quiz."""
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='questions')
+    order = models.PositiveSmallIntegerField()
+    text = models.TextField()
+    explanation = models.TextField(blank=True)
+
+    objects = QuestionManager()
+
+    class Meta:
+        ordering = ['module', 'order']
+        unique_together = ('module', 'order')
+
+    def __str__(self):
+        return f"{self.module.slug} #{self.order}: {self.text}"
+
+    def natural_key(self):
+        return self.module.natural_key() + (self.order,)
+
+    natural_key.dependencies = ['training.module']
+
+
+class ChoiceManager(models.Manager):
+    def get_by_natural_key(self, module_slug, question_order, order):
+        return self.get(question__module__slug=module_slug, question__order=question_order, order=order)
+
+
+class Choice(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
+    order = models.PositiveSmallIntegerField()
+    text = models.CharField(max_length=200)
+    icon = models.CharField(max_length=16, blank=True, help_text="Emoji shown next to the choice")
+    is_correct = models.BooleanField(default=False)
+
+    objects = ChoiceManager()
+
+    class Meta:
+        ordering = ['question', 'order']
+        unique_together = ('question', 'order')
+
+    def __str__(self):
+        return self.text
+
+    def natural_key(self):
+        return self.question.natural_key() + (self.order,)
+
+    natural_key.dependencies = ['training.question']
     
+class ScenarioManager(models.Manager):
+    def get_by_natural_key(self, slug):
+        return self.get(slug=slug)
+
+
 class Scenario(models.Model):
     title = models.CharField(max_length=100)
     slug = models.SlugField(unique=True)
     #Passing score and maximum marks are by default 33 and 100 so aren't stored as a separate field
-    
+    time_limit = models.PositiveSmallIntegerField(default=120, help_text="Seconds before the timeout step")
+
+    objects = ScenarioManager()
+
     def __str__(self):
         return self.title
 
+    def natural_key(self):
+        return (self.slug,)
+
+
+class ScenarioStepManager(models.Manager):
+    def get_by_natural_key(self, scenario_slug, key):
+        return self.get(scenario__slug=scenario_slug, key=key)
+
+
+class ScenarioStep(models.Model):
+    """One node of a scenario's step graph.
+
+    Every scenario starts at the step keyed ``start`` and jumps to ``timeout``
+    when its time limit runs out. A step without options ends the scenario.
+    """
+    CHOICE = 'choice'
+    DIAL = 'dial'
+    WRAP = 'wrap'
+    HEIMLICH = 'heimlich'
+    KIND_CHOICES = [
+        (CHOICE, 'Choose an option'),
+        (DIAL, 'Dial the emergency number'),
+        (WRAP, 'Wrap a sprained joint'),
+        (HEIMLICH, 'Abdominal thrusts'),
+    ]
+
+    scenario = models.ForeignKey(Scenario, on_delete=models.CASCADE, related_name='steps')
+    key = models.SlugField(max_length=50)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=CHOICE,
+                            help_text="Challenges pick the option whose outcome matches how the trainee did")
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent of the progress bar")
+    speaker = models.CharField(max_length=50, default='Narrator')
+    narration = models.TextField()
+    heading = models.CharField(max_length=200, blank=True)
+    image = models.CharField(max_length=200, blank=True, help_text="Static path of the background, blank keeps the last one")
+    inset_image = models.CharField(max_length=200, blank=True, help_text="Static path of an image shown in the dialogue box")
+    score = models.SmallIntegerField(null=True, blank=True, help_text="Score for ending the scenario here")
+
+    objects = ScenarioStepManager()
+
+    class Meta:
+        unique_together = ('scenario', 'key')
+
+    def __str__(self):
+        return f"{self.scenario.slug}: {self.key}"
+
+    def natural_key(self):
+        return self.scenario.natural_key() + (self.key,)
+
+    natural_key.dependencies = ['training.scenario']
+
+
+class ScenarioOptionManager(models.Manager):
+    def get_by_natural_key(self, scenario_slug, step_key, order):
+        return self.get(step__scenario__slug=scenario_slug, step__key=step_key, order=order)
+
+
+class ScenarioOption(models.Model):
+    step = models.ForeignKey(ScenarioStep, on_delete=models.CASCADE, related_name='options')
+    order = models.PositiveSmallIntegerField()
+    text = models.CharField(max_length=200, blank=True)
+    image = models.CharField(max_length=200, blank=True, help_text="Static path, shown instead of a button")
+    outcome = models.CharField(max_length=20, blank=True, help_text="Challenge result that takes this option")
+    next_step = models.ForeignKey(ScenarioStep, on_delete=models.CASCADE, related_name='entries')
+    score_delta = models.SmallIntegerField(default=0)
+
+    objects = ScenarioOptionManager()
+
+    class Meta:
+        ordering = ['step', 'order']
+        unique_together = ('step', 'order')
+
+    def __str__(self):
+        return f"{self.step} -> {self.next_step.key}"
+
+    def natural_key(self):
+        return self.step.natural_key() + (self.order,)
+
+    natural_key.dependencies = ['training.scenariostep']
+
 
 class UserModuleProgress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='module_progress')
@@ -32,6 +185,11 @@ class UserModuleProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'module')
+        indexes = [
+            # Covers refresh_user_score's aggregate and every lookup of a
+            # user's completed modules, so none of them touch the table
+            models.Index(fields=['user', 'completed', 'score', 'time_spent', 'module'], name='moduleprogress_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.module.title} ({self.score})"
@@ -48,6 +206,45 @@ class UserScenarioProgress(models.Model):
 
     class Meta:
         unique_together = ('user', 'scenario')
+        indexes = [
+            models.Index(fields=['user', 'completed', 'score'], name='scenarioprogress_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.scenario.title} ({self.score})"
+
+
+class QuizAttempt(models.Model):
+    """One quiz submission. Append-only; UserModuleProgress keeps the best of these."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='attempts')
+    score = models.PositiveSmallIntegerField()
+    time_spent = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'module', 'created_at'], name='quizattempt_user_idx'),
+            models.Index(fields=['module', 'created_at'], name='quizattempt_module_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.module.title} ({self.score})"
+
+
+class ScenarioAttempt(models.Model):
+    """One scenario submission. Append-only; UserScenarioProgress keeps the best of these."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='scenario_attempts')
+    scenario = models.ForeignKey(Scenario, on_delete=models.CASCADE, related_name='attempts')
+    score = models.PositiveSmallIntegerField()
+    time_spent = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'scenario', 'created_at'], name='scenarioattempt_user_idx'),
+            models.Index(fields=['scenario', 'created_at'], name='scenarioattempt_scenario_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.scenario.title} ({self.score})"
@@ -69,4 +266,28 @@ class UserAchievement(models.Model):
         unique_together = ('user', 'achievement')
 
     def __str__(self):
-        return f"{self.user.username} - {self.achievement.title}"
\ No newline at end of file
+        return f"{self.user.username} - {self.achievement.title}"
+
+
+class UserScore(models.Model):
+    """Denormalized per-user totals backing the leaderboard.
+
+    Kept in sync with the progress tables by ``training.leaderboard.refresh_user_score``
+    so that ranking never has to aggregate the progress tables.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    total_points = models.PositiveIntegerField(default=0)
+    completed_modules = models.PositiveIntegerField(default=0)
+    completed_scenarios = models.PositiveIntegerField(default=0)
+    quick_completions = models.PositiveIntegerField(default=0)  # completed modules with time_spent < 30
+    perfect_scores = models.PositiveIntegerField(default=0)  # completed modules scored 100
+    level = models.CharField(max_length=20, default='Beginner')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_points', 'user'], name='userscore_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total_points} points"
+
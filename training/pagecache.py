@@ -0,0 +1,133 @@
+"""Rendered-page cache for pages without per-user content.
+
+The learning pages only differ between signed-in and anonymous visitors
+(the logout button), so ``cached_page`` renders each once per variant and
+serves the stored HTML afterwards. Entries are keyed by a hash of the
+template sources, including the templates they extend or include, so
+deploying new content starts a new set of entries without any purging.
+
+The pages also embed asset URLs: ``{% static %}`` names from the
+staticfiles manifest and ``{% picture %}`` variants from the image
+manifest. The versions of both manifests are hashed in with the
+templates, so ``collectstatic`` or ``build_images`` starts new entries too.
+
+That hash is the page's ETag and the newest template or manifest
+modification time its Last-Modified, which lets browsers revalidate with
+a 304 before the cache is even consulted.
+"""
+import hashlib
+from functools import lru_cache, wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.template import loader
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .images import manifest_version
+
+
+def _referenced_templates(template):
+    """Names of the templates ``template`` extends or includes with a constant name."""
+    names = []
+    for node_type in (ExtendsNode, IncludeNode):
+        for node in template.nodelist.get_nodes_by_type(node_type):
+            name = node.parent_name if node_type is ExtendsNode else node.template
+            if hasattr(name, 'var') and isinstance(name.var, str):
+                names.append(name.var)
+    return names
+
+
+@lru_cache(maxsize=None)
+def template_version(template_name):
+    """``(content hash, newest mtime)`` of a template and everything it pulls in.
+
+    Computed once per process; a deploy brings new processes and new hashes.
+    """
+    digest = hashlib.sha256()
+    newest = 0
+    seen = set()
+    pending = [template_name]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        template = loader.get_template(name).template
+        digest.update(name.encode())
+        digest.update(template.source.encode())
+        origin = Path(template.origin.name)
+        if origin.exists():
+            newest = max(newest, origin.stat().st_mtime)
+        pending.extend(_referenced_templates(template))
+    return digest.hexdigest()[:16], int(newest)
+
+
+@lru_cache(maxsize=None)
+def _static_manifest():
+    """``(hash, mtime)`` of the staticfiles manifest this process loaded."""
+    static_hash = getattr(staticfiles_storage, 'manifest_hash', '')
+    try:
+        modified = int(Path(staticfiles_storage.path(staticfiles_storage.manifest_name)).stat().st_mtime)
+    except (AttributeError, ImproperlyConfigured, OSError):
+        modified = 0
+    return static_hash, modified
+
+
+def _assets_version():
+    """``(version, mtime)`` of the manifests the page's asset URLs come from.
+
+    The staticfiles manifest is loaded once per process, so its hash is what
+    this process renders. The image manifest is reread whenever it changes.
+    """
+    static_hash, static_modified = _static_manifest()
+    images_mtime_ns = manifest_version()
+    return f'{static_hash}:{images_mtime_ns}', max(static_modified, (images_mtime_ns or 0) // 10 ** 9)
+
+
+def cached_page(template_name):
+    """Serve the view's GET responses from the page cache, keyed on ``template_name``'s content.
+
+    Only for views whose output depends on nothing but the template and
+    whether the visitor is signed in.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            content_hash, templates_modified = template_version(template_name)
+            assets, assets_modified = _assets_version()
+            page_hash = hashlib.sha256(f'{content_hash}:{assets}'.encode()).hexdigest()[:16]
+            last_modified = max(templates_modified, assets_modified)
+            variant = 'user' if request.user.is_authenticated else 'anon'
+            etag = f'"{page_hash}-{variant}"'
+
+            # A browser holding the current version gets a 304 without a cache lookup
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                cache = caches[settings.PAGE_CACHE_ALIAS]
+                key = f'page:{template_name}:{page_hash}:{variant}'
+                content = cache.get(key)
+                if content is None:
+                    rendered = view(request, *args, **kwargs)
+                    if rendered.status_code != 200:
+                        return rendered
+                    content = rendered.content
+                    cache.set(key, content, timeout=None)
+                response = HttpResponse(content)
+
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # The variant comes from the session cookie
+            patch_vary_headers(response, ['Cookie'])
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
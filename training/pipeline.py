@@ -0,0 +1,293 @@
+"""Buffered quiz and scenario submissions.
+
+With ``SUBMISSION_MODE = 'buffered'`` the quiz and scenario views hand
+validated scores to a process-wide ``SubmissionBuffer`` instead of writing
+them straight away. A background thread applies them in batched
+transactions every ``FLUSH_INTERVAL_MS`` or as soon as ``MAX_BATCH``
+records are waiting, so a burst of submissions takes the SQLite write lock
+a handful of times instead of once per request.
+
+Every record is appended to a per-process spool file before the request
+returns and only removed from it after its batch commits. Spool files
+left behind by a process that died are replayed by the next buffer that
+starts; ``start_submission_buffer`` starts it with the server for that.
+Delivery is at least once: a crash between a commit and the spool
+rewrite replays that batch.
+
+The buffer belongs to the process that started it. A worker forked from
+a server that preloaded the app (gunicorn ``--preload``) inherits it
+without its flush thread, so ``submission_buffer`` starts a new one for
+the worker, with its own spool file.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import catalogue
+from .progress import progress_changed, record_quiz_attempt, record_scenario_attempt
+
+logger = logging.getLogger(__name__)
+
+QUIZ = 'quiz'
+SCENARIO = 'scenario'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SubmissionBuffer:
+    def __init__(self, spool_dir, flush_interval_ms=200, max_batch=100):
+        self.spool_dir = Path(spool_dir)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self.pid = os.getpid()
+        self.spool_path = self.spool_dir / f'submissions-{self.pid}.jsonl'
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.enqueued_total = 0
+        self.flushed_total = 0
+        self.failed_total = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    # Producer side
+
+    def submit_quiz(self, user_id, module, score, time_spent=None):
+        self._enqueue({'kind': QUIZ, 'user': user_id, 'item': module.pk, 'score': score, 'time_spent': time_spent})
+
+    def submit_scenario(self, user_id, scenario, score, time_spent=0):
+        self._enqueue({'kind': SCENARIO, 'user': user_id, 'item': scenario.pk, 'score': score, 'time_spent': time_spent})
+
+    def _enqueue(self, record):
+        record['submitted_at'] = time.time()
+        line = json.dumps(record) + '\n'
+        with self._lock:
+            # Durable before the request is acknowledged
+            with open(self.spool_path, 'a') as spool:
+                spool.write(line)
+                spool.flush()
+                os.fsync(spool.fileno())
+            self._pending.append(record)
+            self.enqueued_total += 1
+            depth = len(self._pending)
+        if depth >= self.max_batch:
+            self._wakeup.set()
+
+    # Consumer side
+
+    def start(self):
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self._recover_orphans()
+        self._thread = threading.Thread(target=self._run, name='submission-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.pid != os.getpid():
+            # A copy inherited by a forked worker, the process that started it flushes it
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Submission buffer flush failed")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Apply every pending record, ``max_batch`` records per transaction."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.max_batch]
+                if not batch:
+                    return
+                started = time.monotonic()
+                failed = self._apply(batch)
+                elapsed_ms = (time.monotonic() - started) * 1000
+
+                with self._lock:
+                    del self._pending[:len(batch)]
+                    self._rewrite_spool()
+                    self.flushed_total += len(batch) - len(failed)
+                    self.failed_total += len(failed)
+                    self.flush_count += 1
+                    self.last_flush_ms = elapsed_ms
+                    self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+                    self.total_flush_ms += elapsed_ms
+
+    def _apply(self, batch):
+        """Write ``batch`` in one transaction, returns the records that were dropped."""
+        try:
+            with transaction.atomic():
+                self._write(batch)
+            return []
+        except Exception:
+            logger.exception("Batch of %d submissions failed, retrying one by one", len(batch))
+
+        failed = []
+        for record in batch:
+            try:
+                with transaction.atomic():
+                    self._write([record])
+            except Exception:
+                logger.exception("Dropping submission %r", record)
+                failed.append(record)
+        return failed
+
+    def _write(self, batch):
+        modules = catalogue.modules()
+        scenarios = catalogue.scenarios()
+        users = set()
+        for record in batch:
+            submitted_at = datetime.fromtimestamp(record['submitted_at'], tz=timezone.utc)
+            if record['kind'] == QUIZ:
+                record_quiz_attempt(record['user'], modules[record['item']], record['score'],
+                                    record['time_spent'], submitted_at)
+            else:
+                record_scenario_attempt(record['user'], scenarios[record['item']], record['score'],
+                                        record['time_spent'], submitted_at)
+            users.add(record['user'])
+        # Derived data is refreshed once per user rather than once per record
+        for user_id in users:
+            progress_changed(user_id)
+
+    def _rewrite_spool(self):
+        # Called with self._lock held: the spool keeps exactly the pending records
+        if not self._pending:
+            self.spool_path.unlink(missing_ok=True)
+            return
+        tmp_path = self.spool_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as spool:
+            spool.writelines(json.dumps(record) + '\n' for record in self._pending)
+            spool.flush()
+            os.fsync(spool.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+    def _recover_orphans(self):
+        """Adopt spool files of processes that are gone, including a previous run of this one.
+
+        Each orphan is first renamed to a claim named after this process, so
+        when several workers start together only one of them replays it. A
+        claim left by a worker that died before replaying it is an orphan too.
+        """
+        recovered = []
+        claims = []
+        for path in sorted([*self.spool_dir.glob('submissions-*.jsonl'), *self.spool_dir.glob('claimed-*.jsonl')]):
+            try:
+                pid = int(path.stem.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            if path != self.spool_path:
+                claim = self.spool_dir / f'claimed-{os.getpid()}-{time.time_ns()}.jsonl'
+                try:
+                    os.replace(path, claim)
+                except FileNotFoundError:
+                    # Another worker claimed it first
+                    continue
+                claims.append(claim)
+                path = claim
+            with open(path) as spool:
+                for line in spool:
+                    line = line.strip()
+                    if line:
+                        try:
+                            recovered.append(json.loads(line))
+                        except ValueError:
+                            # A torn final line from a crash mid-write
+                            logger.warning("Skipping unreadable spool line in %s", path)
+        if recovered:
+            logger.info("Replaying %d spooled submissions", len(recovered))
+            with self._lock:
+                self._pending[:0] = recovered
+                self.enqueued_total += len(recovered)
+                self._rewrite_spool()
+            self._wakeup.set()
+        # Only once the records are safe in this process's own spool
+        for claim in claims:
+            claim.unlink(missing_ok=True)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'queue_depth': len(self._pending),
+                'enqueued_total': self.enqueued_total,
+                'flushed_total': self.flushed_total,
+                'failed_total': self.failed_total,
+                'flush_count': self.flush_count,
+                'last_flush_ms': self.last_flush_ms,
+                'max_flush_ms': self.max_flush_ms,
+                'total_flush_ms': self.total_flush_ms,
+                'avg_flush_ms': self.total_flush_ms / self.flush_count if self.flush_count else 0.0,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def buffered_submissions_enabled():
+    return settings.SUBMISSION_MODE == 'buffered'
+
+
+def submission_buffer():
+    """This process's buffer, started on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            options = settings.SUBMISSION_BUFFER
+            _buffer = SubmissionBuffer(
+                options['SPOOL_DIR'],
+                flush_interval_ms=options.get('FLUSH_INTERVAL_MS', 200),
+                max_batch=options.get('MAX_BATCH', 100),
+            )
+            _buffer.start()
+        return _buffer
+
+
+def buffer_metrics():
+    """``SubmissionBuffer.metrics`` of this process's buffer, or None when it has not started."""
+    current = _buffer
+    if current is None or current.pid != os.getpid():
+        return None
+    return current.metrics()
+
+
+def start_submission_buffer():
+    """Start the buffer with the server, so spools of workers that died are replayed right away."""
+    if buffered_submissions_enabled():
+        submission_buffer()
@@ -0,0 +1,152 @@
+"""Opt-in sampling profiler for individual requests.
+
+``ProfilingMiddleware`` profiles a request when one of these holds:
+
+- it carries an ``X-Profile`` header equal to ``PROFILING['TOKEN']``;
+- a staff member added ``?profile=1``;
+- it is picked at random, at ``PROFILING['SAMPLE_RATE']``.
+
+A profiled request runs as usual while a sampler thread records the
+request thread's Python stack every ``PROFILING['INTERVAL_MS']``. The
+samples are appended to ``<url name>.folded`` in ``PROFILING['DIR']`` in
+the collapsed-stack format used by flamegraph tools, one
+``frame;frame;frame count`` line per distinct stack. Files rotate like a
+``RotatingFileHandler``. ``manage.py merge_profiles`` adds them up into one
+file for ``flamegraph.pl`` or speedscope.
+
+When a request is not picked, the only cost is a header lookup and a
+random number.
+"""
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+
+HEADER = 'X-Profile'
+SAMPLES_HEADER = 'X-Profile-Samples'
+SUFFIX = '.folded'
+UNMATCHED = '<unmatched>'
+
+_write_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _short_path(filename):
+    """``filename`` relative to the project or the ``sys.path`` entry it was imported from."""
+    roots = sorted({str(settings.BASE_DIR), *(entry for entry in sys.path if entry)}, key=len, reverse=True)
+    for root in roots:
+        if filename.startswith(root.rstrip(os.sep) + os.sep):
+            return filename[len(root.rstrip(os.sep)) + 1:]
+    return filename
+
+
+def _frame_name(code):
+    # Keyed by the function's first line, so every sample in it merges into one frame
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+
+def collapse(frame, root_code=None):
+    """The stack ending at ``frame`` as ``outer;...;inner``, cut below ``root_code`` when given."""
+    names = []
+    while frame is not None and frame.f_code is not root_code:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Record another thread's stack every ``interval`` seconds until stopped."""
+
+    def __init__(self, thread_id, interval, root_code=None):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root_code = root_code
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        # The sampled thread waiting for us in stop() is not part of its profile
+        stopping = _frame_name(Sampler.stop.__code__)
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = collapse(frame, self.root_code)
+                if stack and not stack.startswith(stopping):
+                    self.stacks[stack] += 1
+            del frame
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+def _rotate(path, backup_count):
+    for index in range(backup_count - 1, 0, -1):
+        source = path.with_name(f'{path.name}.{index}')
+        if source.exists():
+            os.replace(source, path.with_name(f'{path.name}.{index + 1}'))
+    if backup_count:
+        os.replace(path, path.with_name(f'{path.name}.1'))
+    else:
+        path.unlink()
+
+
+def store(view_name, stacks):
+    """Append a request's samples to the file for its view, rotating it when full."""
+    config = settings.PROFILING
+    directory = Path(config['DIR'])
+    # Namespaced names such as admin:index become admin.index
+    path = directory / (view_name.replace(':', '.').replace(os.sep, '_') + SUFFIX)
+    lines = ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+    with _write_lock:
+        directory.mkdir(parents=True, exist_ok=True)
+        if path.exists() and path.stat().st_size + len(lines) > config['MAX_BYTES']:
+            _rotate(path, config['BACKUP_COUNT'])
+        # One write per request, so appends from other workers never interleave mid-line
+        with open(path, 'a', encoding='utf-8') as output:
+            output.write(lines)
+
+
+def should_profile(request):
+    config = settings.PROFILING
+    token = config['TOKEN']
+    if token and request.headers.get(HEADER) == token:
+        return True
+    # Only look at the user when asked, it costs a session and user query
+    if 'profile' in request.GET and request.user.is_staff:
+        return True
+    return random.random() < config['SAMPLE_RATE']
+
+
+class ProfilingMiddleware:
+    """Sample the stacks of the requests ``should_profile`` picks."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        return self._profile(request)
+
+    def _profile(self, request):
+        sampler = Sampler(
+            threading.get_ident(), settings.PROFILING['INTERVAL_MS'] / 1000, root_code=self._profile.__code__,
+        )
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        match = getattr(request, 'resolver_match', None)
+        if stacks:
+            store(match.view_name if match and match.view_name else UNMATCHED, stacks)
+        response[SAMPLES_HEADER] = str(sum(stacks.values()))
+        return response
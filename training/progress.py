@@ -0,0 +1,132 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .achievements import unlock_achievements
+from .leaderboard import refresh_user_score
+from .models import QuizAttempt, ScenarioAttempt, UserModuleProgress, UserScenarioProgress
+from .stats import invalidate_user_stats
+
+
+# Scenarios are marked out of 100 and passed at 33, see the Scenario model
+SCENARIO_PASSING_SCORE = 33
+
+
+def progress_changed(user_id):
+    """Bring everything derived from a user's progress rows up to date.
+
+    Returns the achievements this unlocked.
+    """
+    score, changed = refresh_user_score(user_id)
+    unlocked = unlock_achievements(score, changed)
+    invalidate_user_stats(user_id)
+    return unlocked
+
+
+def _upsert(queryset, updates, create):
+    """Apply ``updates`` to the row matched by ``queryset``, creating it if missing.
+
+    The update is a single ``UPDATE`` whose new values are computed by the
+    database from the current row, so concurrent submissions cannot lose
+    each other's writes. Only the very first submission needs the insert.
+    """
+    if queryset.update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            create()
+    except IntegrityError:
+        # Another request inserted the row first, fold this submission into it.
+        # No row to fold into means the insert itself was invalid.
+        if not queryset.update(**updates):
+            raise
+
+
+def record_quiz_attempt(user_id, module, score, time_spent=None, submitted_at=None):
+    """Append a ``QuizAttempt`` and fold it into the user's ``UserModuleProgress`` row.
+
+    Does not refresh derived data; callers run ``progress_changed`` once
+    the transaction holding one or more of these is ready to commit.
+    """
+    now = submitted_at or timezone.now()
+    updates = {
+        'attempts': F('attempts') + 1,
+        'score': Greatest('score', Value(score)),
+        'last_attempt': now,
+    }
+    if time_spent is not None:
+        updates['time_spent'] = Least('time_spent', Value(time_spent))
+    if score >= module.passing_score:
+        # The best score never goes down, so neither does completion
+        updates['completed'] = True
+
+    def create():
+        progress = UserModuleProgress(user_id=user_id, module_id=module.pk, score=score, attempts=1,
+                                      completed=score >= module.passing_score)
+        if time_spent is not None:
+            progress.time_spent = time_spent
+        # bulk_create skips post_save, the caller runs progress_changed()
+        UserModuleProgress.objects.bulk_create([progress])
+
+    QuizAttempt.objects.create(user_id=user_id, module_id=module.pk, score=score, time_spent=time_spent, created_at=now)
+    _upsert(UserModuleProgress.objects.filter(user_id=user_id, module_id=module.pk), updates, create)
+
+
+def record_scenario_attempt(user_id, scenario, score, time_spent=0, submitted_at=None):
+    """Append a ``ScenarioAttempt`` and fold it into the user's ``UserScenarioProgress`` row.
+
+    A higher score replaces the score, completion and time of the previous
+    best run in the same ``UPDATE`` that counts the attempt. Like
+    ``record_quiz_attempt`` this leaves ``progress_changed`` to the caller.
+    """
+    now = submitted_at or timezone.now()
+
+    def if_improved(value, field):
+        return Case(When(score__lt=score, then=Value(value)), default=F(field),
+                    output_field=UserScenarioProgress._meta.get_field(field))
+
+    updates = {
+        'attempts': F('attempts') + 1,
+        'score': if_improved(score, 'score'),
+        'completed': if_improved(score >= SCENARIO_PASSING_SCORE, 'completed'),
+        'time_spent': if_improved(time_spent, 'time_spent'),
+        'last_attempt': now,
+    }
+
+    def create():
+        UserScenarioProgress.objects.bulk_create([UserScenarioProgress(
+            user_id=user_id, scenario_id=scenario.pk, score=score, attempts=1, time_spent=time_spent,
+            completed=score >= SCENARIO_PASSING_SCORE,
+        )])
+
+    ScenarioAttempt.objects.create(user_id=user_id, scenario_id=scenario.pk, score=score, time_spent=time_spent, created_at=now)
+    _upsert(UserScenarioProgress.objects.filter(user_id=user_id, scenario_id=scenario.pk), updates, create)
+
+
+def submit_quiz_score(user, module, score, time_spent=None):
+    """Record one quiz submission and refresh everything derived from it.
+
+    Returns the achievements it unlocked.
+    """
+    with transaction.atomic():
+        record_quiz_attempt(user.pk, module, score, time_spent)
+        return progress_changed(user.pk)
+
+
+def submit_scenario_score(user, scenario, score, time_spent=0):
+    """Record one scenario submission.
+
+    Returns whether it beat the previous best, and the achievements it unlocked.
+    """
+    # Only used for the return value, the UPDATE compares against whatever
+    # the row holds when it runs. Read outside the transaction so it starts
+    # with the write and SQLite never has to upgrade a read lock.
+    previous_best = (
+        UserScenarioProgress.objects.filter(user=user, scenario_id=scenario.pk)
+        .values_list('score', flat=True).first()
+    ) or 0
+    with transaction.atomic():
+        record_scenario_attempt(user.pk, scenario, score, time_spent)
+        unlocked = progress_changed(user.pk)
+    return score > previous_best, unlocked
@@ -0,0 +1,77 @@
+"""Versioned quiz bundles built from the question bank.
+
+Each module's questions and choices are compiled into one JSON document in
+the shape the quiz page's script reads::
+
+    {"module": "burns_quiz", "version": "3f0c9a1b2d4e",
+     "questions": [{"question": "...", "explanation": "...",
+                    "options": [{"text": "...", "isCorrect": true, "icon": "..."}, ...]}, ...]}
+
+``version`` is a hash of the questions, so the bundle URL changes exactly
+when the content does and can be cached by browsers forever. Bundles are
+held in process per catalogue version: editing a question bumps that
+version (see ``training.signals``) and every process rebuilds on its next
+request.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+
+from django.db import DEFAULT_DB_ALIAS
+
+from . import catalogue
+from .models import Choice, Question
+
+VERSION_LENGTH = 12
+
+
+@dataclass(frozen=True)
+class QuizBundle:
+    module: str
+    version: str
+    content: bytes
+
+
+_bundles = (None, {})
+_lock = threading.Lock()
+
+
+def _build(module):
+    # From the primary, like the catalogue whose version the bundle is kept under
+    choices = {}
+    for choice in Choice.objects.using(DEFAULT_DB_ALIAS).filter(question__module_id=module.pk).order_by('question_id', 'order'):
+        choices.setdefault(choice.question_id, []).append(
+            {'text': choice.text, 'isCorrect': choice.is_correct, 'icon': choice.icon}
+        )
+    questions = [
+        {
+            'question': question.text,
+            'options': choices.get(question.pk, []),
+            'explanation': question.explanation,
+        }
+        for question in Question.objects.using(DEFAULT_DB_ALIAS).filter(module_id=module.pk).order_by('order')
+    ]
+    payload = json.dumps(questions, ensure_ascii=False, separators=(',', ':'))
+    version = hashlib.sha256(payload.encode()).hexdigest()[:VERSION_LENGTH]
+    content = json.dumps(
+        {'module': module.slug, 'version': version, 'questions': questions},
+        ensure_ascii=False, separators=(',', ':'),
+    ).encode()
+    return QuizBundle(module=module.slug, version=version, content=content)
+
+
+def quiz_bundle(module):
+    """The current ``QuizBundle`` for a module (record or instance)."""
+    global _bundles
+    version = catalogue.catalogue().version
+    bundles_version, bundles = _bundles
+    if bundles_version != version:
+        bundles = {}
+    bundle = bundles.get(module.pk)
+    if bundle is None:
+        bundle = _build(module)
+        bundles = {**bundles, module.pk: bundle}
+        with _lock:
+            _bundles = (version, bundles)
+    return bundle
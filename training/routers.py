@@ -0,0 +1,91 @@
+"""Primary/replica database routing.
+
+Every write goes to the ``default`` (primary) database. Views wrapped in
+``replica_reads`` send their reads to one of ``settings.REPLICA_DATABASES``
+instead, the same one for every query of the request so a page never mixes
+replicas that lag by different amounts, unless the user changed something in the last
+``READ_YOUR_WRITES_SECONDS``: ``ReplicaRoutingMiddleware`` pins a session to
+the primary after any POST so a trainee always sees their own submission,
+however far the replicas lag behind.
+
+With no replicas configured everything reads from the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PINNED_UNTIL_SESSION_KEY = '_primary_pinned_until'
+
+# Apps whose rows must always be read back from where they were just
+# written, whatever view is running
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# Alias of the replica the current request reads from, None for the primary
+_replica = ContextVar('replica', default=None)
+
+
+def _is_pinned(request):
+    session = getattr(request, 'session', None)
+    return session is not None and session.get(PINNED_UNTIL_SESSION_KEY, 0) > time.time()
+
+
+def pin_to_primary(request):
+    """Read from the primary for this session for the next ``READ_YOUR_WRITES_SECONDS``."""
+    request.session[PINNED_UNTIL_SESSION_KEY] = time.time() + settings.READ_YOUR_WRITES_SECONDS
+
+
+def replica_reads(view):
+    """Mark a read-only view whose queries may be served by a replica."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not settings.REPLICA_DATABASES
+            or _replica.get() is not None
+            or request.method not in ('GET', 'HEAD')
+            or _is_pinned(request)
+        ):
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(settings.REPLICA_DATABASES))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+class ReplicaRoutingMiddleware:
+    """Pin the session to the primary after every request that may have written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if settings.REPLICA_DATABASES and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            if hasattr(request, 'session'):
+                pin_to_primary(request)
+        return response
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        return obj1._state.db in databases and obj2._state.db in databases
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
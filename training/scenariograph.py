@@ -0,0 +1,164 @@
+"""Scenario step graphs, compiled for ``static/js/scenario_engine.js``.
+
+A scenario's ``ScenarioStep`` rows and their options become one JSON
+document with every step keyed by name::
+
+    {"scenario": "burns_scenario", "version": "9d1e0c7a22b4", "timeLimit": 60,
+     "start": "start", "timeout": "timeout",
+     "steps": {"start": {"progress": 10, "speaker": "Narrator", "narration": "...",
+                         "image": "/static/optimized/Images/burns_1-1920.0c1d2e3f4a.webp",
+                         "options": [{"text": "...", "next": "towel"}, ...],
+                         "preload": [...], "prefetch": [...]}, ...}}
+
+Empty fields are left out. Image paths are resolved to the optimized
+variants, and each step lists what the engine should fetch ahead: the
+images of the steps one choice away under ``preload``, everything further
+along under ``prefetch``. Leaving a step never waits on the network.
+
+As with ``training.quizbank``, ``version`` hashes the content and graphs
+are held in process until the catalogue version or the image manifest
+changes.
+"""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+
+from django.db import DEFAULT_DB_ALIAS
+
+from . import catalogue
+from .images import manifest_version
+from .models import ScenarioOption, ScenarioStep
+from .templatetags.images import image_url
+
+START_STEP = 'start'
+TIMEOUT_STEP = 'timeout'
+VERSION_LENGTH = 12
+
+
+@dataclass(frozen=True)
+class ScenarioGraph:
+    scenario: str
+    version: str
+    content: bytes
+
+
+_graphs = (None, {})
+_lock = threading.Lock()
+
+
+def _compact(fields):
+    return {name: value for name, value in fields.items() if value not in ('', None, [])}
+
+
+def _reachable(key, edges):
+    """Steps reachable from ``key``, nearest first, as ``(distance, key)``."""
+    seen = {key}
+    frontier = [key]
+    distance = 0
+    order = []
+    while frontier:
+        distance += 1
+        following = []
+        for current in frontier:
+            for target in edges[current]:
+                if target not in seen:
+                    seen.add(target)
+                    following.append(target)
+                    order.append((distance, target))
+        frontier = following
+    return order
+
+
+def _build(scenario):
+    # From the primary, like the catalogue whose version the graph is kept under
+    steps = {step.pk: step for step in ScenarioStep.objects.using(DEFAULT_DB_ALIAS).filter(scenario_id=scenario.pk)}
+    options = {pk: [] for pk in steps}
+    for option in ScenarioOption.objects.using(DEFAULT_DB_ALIAS).filter(step__scenario_id=scenario.pk).order_by('step_id', 'order'):
+        options[option.step_id].append(option)
+
+    urls = {}
+
+    def url(path):
+        if path and path not in urls:
+            urls[path] = image_url(path)
+        return urls.get(path)
+
+    keys = {pk: step.key for pk, step in steps.items()}
+    edges = {step.key: [keys[option.next_step_id] for option in options[pk]] for pk, step in steps.items()}
+    by_key = {step.key: step for step in steps.values()}
+    shown = {
+        step.key: [url(path) for path in (step.image, step.inset_image) if path]
+        + [url(option.image) for option in options[pk] if option.image]
+        for pk, step in steps.items()
+    }
+
+    compiled = {}
+    for pk, step in sorted(steps.items(), key=lambda item: item[1].key):
+        reachable = _reachable(step.key, edges)
+        if options[pk] and TIMEOUT_STEP in by_key:
+            # The timer can end any step that is not an ending
+            reachable.append((2, TIMEOUT_STEP))
+        fetched = set(shown[step.key])
+        preload, prefetch = [], []
+        for distance, key in reachable:
+            for asset in shown[key]:
+                if asset not in fetched:
+                    fetched.add(asset)
+                    (preload if distance == 1 else prefetch).append(asset)
+
+        compiled[step.key] = _compact({
+            'kind': step.kind if step.kind != ScenarioStep.CHOICE else '',
+            'progress': step.progress,
+            'speaker': step.speaker,
+            'narration': step.narration,
+            'heading': step.heading,
+            'image': url(step.image),
+            'inset': url(step.inset_image),
+            'score': step.score,
+            'options': [
+                _compact({
+                    'text': option.text,
+                    'image': url(option.image),
+                    'outcome': option.outcome,
+                    'next': keys[option.next_step_id],
+                    'scoreDelta': option.score_delta or None,
+                })
+                for option in options[pk]
+            ],
+            'preload': preload,
+            'prefetch': prefetch,
+        })
+
+    payload = json.dumps(
+        [scenario.time_limit, START_STEP, TIMEOUT_STEP, compiled], ensure_ascii=False, separators=(',', ':'),
+    )
+    version = hashlib.sha256(payload.encode()).hexdigest()[:VERSION_LENGTH]
+    content = json.dumps(
+        {
+            'scenario': scenario.slug,
+            'version': version,
+            'timeLimit': scenario.time_limit,
+            'start': START_STEP,
+            'timeout': TIMEOUT_STEP,
+            'steps': compiled,
+        },
+        ensure_ascii=False, separators=(',', ':'),
+    ).encode()
+    return ScenarioGraph(scenario=scenario.slug, version=version, content=content)
+
+
+def scenario_graph(scenario):
+    """The current ``ScenarioGraph`` for a scenario record."""
+    global _graphs
+    version = (catalogue.catalogue().version, manifest_version())
+    graphs_version, graphs = _graphs
+    if graphs_version != version:
+        graphs = {}
+    graph = graphs.get(scenario.pk)
+    if graph is None:
+        graph = _build(scenario)
+        graphs = {**graphs, scenario.pk: graph}
+        with _lock:
+            _graphs = (version, graphs)
+    return graph
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .catalogue import invalidate_catalogue
+from .leaderboard import refresh_user_score
+from .models import (
+    Choice, Module, Question, Scenario, ScenarioOption, ScenarioStep, UserAchievement, UserModuleProgress,
+    UserScenarioProgress, UserScore,
+)
+from .progress import progress_changed
+from .stats import invalidate_user_stats
+
+
+@receiver(post_save, sender=User)
+def create_user_score(sender, instance, created, raw=False, **kwargs):
+    # Every trainee is listed on the leaderboard, even before their first quiz
+    if created and not raw:
+        UserScore.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=UserModuleProgress)
+@receiver(post_save, sender=UserScenarioProgress)
+def progress_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        progress_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=UserModuleProgress)
+@receiver(post_delete, sender=UserScenarioProgress)
+def progress_deleted(sender, instance, **kwargs):
+    # The user may be going away too, so never recreate their score row here
+    refresh_user_score(instance.user_id, create=False)
+    invalidate_user_stats(instance.user_id)
+
+
+@receiver(post_save, sender=UserAchievement)
+@receiver(post_delete, sender=UserAchievement)
+def achievement_changed(sender, instance, **kwargs):
+    invalidate_user_stats(instance.user_id)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Scenario)
+@receiver(post_delete, sender=Scenario)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+@receiver(post_save, sender=ScenarioStep)
+@receiver(post_delete, sender=ScenarioStep)
+@receiver(post_save, sender=ScenarioOption)
+@receiver(post_delete, sender=ScenarioOption)
+def catalogue_changed(sender, **kwargs):
+    # Fixtures included, so no raw check
+    invalidate_catalogue()
@@ -0,0 +1,145 @@
+"""Log of slow SQL queries, with the Python line that ran them.
+
+``log_slow_queries`` is installed as the innermost execute wrapper on every
+database connection (see ``TrainingConfig.ready``). A query taking longer
+than ``SLOW_QUERY_MS`` is appended to ``SLOW_QUERY_LOG``, when that is set,
+as one JSON line::
+
+    {"time": "2026-10-18T09:30:12.412+00:00", "duration_ms": 182.4, "database": "default",
+     "sql": "SELECT ... WHERE ... = %s", "params": [3], "fingerprint": "SELECT ... = %s",
+     "plan": ["SEARCH training_userscore USING INDEX ..."],
+     "view": {"file": "training/views.py", "line": 80, "function": "_leaderboard_data",
+              "code": "page, entries = leaderboard_page(...)"},
+     "caller": {"file": "training/leaderboard.py", "line": 41, ...}}
+
+``view`` is the innermost frame in ``training/views.py``, the line of the
+view that led to the query, even when the query ran lazily while a
+template was rendered. ``caller`` is the innermost frame of the project
+itself, e.g. a helper in ``training/stats.py``. ``plan`` holds the
+database's ``EXPLAIN`` of SELECT statements. ``fingerprint`` is the SQL
+with numbers and ``IN`` lists folded, so ``manage.py slow_queries`` can
+group the runs of one query.
+
+Fast queries only pay for two ``perf_counter`` calls. Failed queries are
+not logged, and a failure to log is reported without failing the query.
+"""
+import json
+import linecache
+import logging
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+VIEWS_FILE = Path(__file__).with_name('views.py')
+
+_explaining = ContextVar('explaining_slow_query', default=False)
+_write_lock = threading.Lock()
+
+
+def install(sender, connection, **kwargs):
+    """``connection_created`` hook adding ``log_slow_queries`` to the connection's execute wrappers."""
+    if log_slow_queries not in connection.execute_wrappers:
+        # First in the list is innermost, it times the database alone. It also keeps the
+        # wrapper out of the way of execute_wrapper() blocks, which pop the last entry.
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+def fingerprint(sql):
+    """``sql`` with numbers and ``IN`` lists folded, the same for every run of a query."""
+    sql = re.sub(r'%s(?:, %s)+', '%s, ...', sql)
+    return re.sub(r'(?<![\w"])-?\d+(?:\.\d+)?\b', '?', sql)
+
+
+def _frame_info(frame):
+    code = frame.f_code
+    path = Path(code.co_filename)
+    return {
+        'file': str(path.relative_to(settings.BASE_DIR) if path.is_relative_to(settings.BASE_DIR) else path),
+        'line': frame.f_lineno,
+        'function': code.co_name,
+        'code': linecache.getline(code.co_filename, frame.f_lineno).strip(),
+    }
+
+
+def _origin():
+    """The innermost ``views.py`` frame and the innermost project frame running this query."""
+    view = caller = None
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(3)
+    while frame is not None and view is None:
+        filename = frame.f_code.co_filename
+        if filename == str(VIEWS_FILE):
+            view = _frame_info(frame)
+        if caller is None and filename.startswith(base_dir) and 'site-packages' not in filename \
+                and filename != __file__:
+            caller = _frame_info(frame)
+        frame = frame.f_back
+    return view, caller
+
+
+def _plan(connection, sql, params):
+    if sql.split(None, 1)[0].upper() not in ('SELECT', 'WITH') or not connection.ops.explain_prefix:
+        return None
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            # SQLite gives (id, parent, notused, detail), PostgreSQL one line per row
+            return [str(row[-1]) for row in cursor.fetchall()]
+    except DatabaseError as exc:
+        return [f'EXPLAIN failed: {exc}']
+    finally:
+        _explaining.reset(token)
+
+
+def _jsonable(params):
+    return json.loads(json.dumps(params, default=str)) if params is not None else None
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    if _explaining.get() or not settings.SLOW_QUERY_LOG:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS:
+        try:
+            _log(sql, params, many, context['connection'], duration_ms)
+        except Exception:
+            logger.exception("Could not log a slow query")
+    return result
+
+
+def _log(sql, params, many, connection, duration_ms):
+    view, caller = _origin()
+    write({
+        'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'duration_ms': round(duration_ms, 3),
+        'database': connection.alias,
+        'sql': sql,
+        # executemany() may be handed an iterator that is used up by now
+        'params': None if many else _jsonable(params),
+        'many': many,
+        'fingerprint': fingerprint(sql),
+        'plan': None if many else _plan(connection, sql, params),
+        'view': view,
+        'caller': caller,
+    })
+
+
+def write(entry):
+    path = Path(settings.SLOW_QUERY_LOG)
+    line = json.dumps(entry, ensure_ascii=False) + '\n'
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as log:
+            log.write(line)
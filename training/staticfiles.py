@@ -0,0 +1,143 @@
+"""Long-lived static files.
+
+``CompressedManifestStaticFilesStorage`` gives every collected file a
+content-hashed name and writes ``.gz`` and, when the ``brotli`` package is
+installed, ``.br`` siblings of the compressible ones. ``StaticFilesMiddleware``
+serves ``STATIC_ROOT`` with the precompressed copy the browser accepts and
+marks hashed names immutable, so a returning visitor requests none of them
+until a deploy changes their content.
+"""
+import gzip
+import mimetypes
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_header_parameters
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Already compressed, another pass only costs CPU
+INCOMPRESSIBLE_SUFFIXES = {
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico',
+    '.woff', '.woff2', '.gz', '.br', '.zip', '.mp3', '.mp4', '.webm',
+}
+# Smaller files are not worth a second request header
+MIN_COMPRESS_SIZE = 256
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names can change content under the same URL
+SHORT_CACHE_CONTROL = 'public, max-age=60'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # Templates name a few files that are not collected (or not with that
+        # case), and nothing is collected in development; keep their plain URL
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not dry_run and hashed_name and not isinstance(processed, Exception):
+                # The unhashed copy is collected as well, for URLs built without the manifest
+                self._compress(name)
+                self._compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def _compress(self, name):
+        path = Path(self.path(name))
+        if path.suffix.lower() in INCOMPRESSIBLE_SUFFIXES:
+            return
+        data = path.read_bytes()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # Only keep copies that save at least 5%
+            if len(compressed) < len(data) * 0.95:
+                path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` for an ``Accept-Encoding`` header."""
+    codings = {}
+    for part in header.split(','):
+        coding, params = parse_header_parameters(part)
+        if not coding:
+            continue
+        try:
+            codings[coding] = float(params.get('q', 1))
+        except ValueError:
+            codings[coding] = 0
+    return codings
+
+
+class StaticFilesMiddleware:
+    """Serve ``STATIC_ROOT`` before the rest of the middleware touches the request."""
+
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self.root = Path(settings.STATIC_ROOT).resolve() if settings.STATIC_ROOT else None
+        self._immutable_names = None
+
+    def __call__(self, request):
+        if self.root is not None and request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def immutable_names(self):
+        if self._immutable_names is None:
+            hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+            self._immutable_names = set(hashed_files.values())
+        return self._immutable_names
+
+    def serve(self, request, name):
+        path = (self.root / name).resolve()
+        if self.root not in path.parents or not path.is_file():
+            return None
+        stat = path.stat()
+
+        response = get_conditional_response(request, last_modified=int(stat.st_mtime))
+        if response is None:
+            serve_path, encoding = path, None
+            accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+            # Highest q-value first, our order between equals; q=0 means never
+            candidates = sorted(
+                ((accepted.get(candidate, accepted.get('*', 0)), -order, candidate, suffix)
+                 for order, (candidate, suffix) in enumerate(self.encodings)),
+                reverse=True,
+            )
+            for q, _, candidate, suffix in candidates:
+                compressed = path.with_name(path.name + suffix)
+                if q > 0 and compressed.is_file():
+                    serve_path, encoding = compressed, candidate
+                    break
+            content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+            response = FileResponse(open(serve_path, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = http_date(stat.st_mtime)
+
+        if name in self.immutable_names():
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = SHORT_CACHE_CONTROL
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models import Count, Sum
+
+from . import versions
+from .leaderboard import per_user, refresh_user_score
+from .models import UserAchievement, UserModuleProgress, UserScore
+
+
+@dataclass(frozen=True)
+class UserStats:
+    """Everything the profile, achievements and leaderboard pages show about one user."""
+    user_id: int
+    total_points: int
+    completed_modules: int
+    completed_scenarios: int
+    achievement_count: int
+    completed_module_points: int
+    level: str
+
+    @property
+    def accuracy(self):
+        # Average score over completed modules, each module is worth 100 points
+        if not self.completed_modules:
+            return 0
+        return min(self.completed_module_points / self.completed_modules, 100)
+
+
+def _cache():
+    return caches[settings.STATS_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f'user-stats-version:{user_id}'
+
+
+def invalidate_user_stats(user_id):
+    """Bump the user's stats version once the current transaction commits."""
+    transaction.on_commit(lambda: versions.bump(_cache(), _version_key(user_id)))
+
+
+def get_user_stats(user):
+    """Return a user's ``UserStats``, from the stats cache when possible.
+
+    Entries are keyed by user id and a version counter that
+    ``invalidate_user_stats`` bumps whenever progress is saved, so a
+    cached entry is never older than the user's last submission.
+    """
+    key = f'user-stats:{user.pk}:{versions.current(_cache(), _version_key(user.pk))}'
+    stats = _cache().get(key)
+    if stats is None:
+        stats = load_user_stats(user)
+        _cache().set(key, stats)
+    return stats
+
+
+def load_user_stats(user):
+    """Load a user's ``UserStats`` with a single query.
+
+    The counters come from the user's ``UserScore`` row; the two numbers it
+    does not hold are correlated subqueries on the same statement.
+    """
+    fields = ('total_points', 'completed_modules', 'completed_scenarios', 'level')
+    queryset = UserScore.objects.filter(user_id=user.pk).annotate(
+        achievement_count=per_user(UserAchievement, Count('pk')),
+        completed_module_points=per_user(UserModuleProgress, Sum('score'), completed=True),
+    ).values(*fields, 'achievement_count', 'completed_module_points')
+
+    row = queryset.first()
+    if row is None:
+        refresh_user_score(user.pk)
+        # Just written to the primary, which a replica may not have caught up with
+        row = queryset.using(router.db_for_write(UserScore)).first()
+    return UserStats(user_id=user.pk, **row)
@@ -0,0 +1,57 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from training.images import lookup
+
+register = template.Library()
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+
+@register.simple_tag
+def image_url(path, width=None, format='webp'):
+    """URL of the ``format`` variant of a static image closest to ``width`` (default: the widest).
+
+    For CSS backgrounds and other places ``<picture>`` can't go. Falls back
+    to the original file when no variant has been built.
+    """
+    entry = lookup(path)
+    if entry is None or format not in entry['variants']:
+        return static(path)
+    variants = entry['variants'][format]
+    if width is not None:
+        candidates = [variant for variant in variants if variant[0] >= int(width)]
+        variants = candidates[:1] or variants
+    return static(variants[-1][1])
+
+
+@register.simple_tag
+def picture(path, alt='', sizes='100vw', **attrs):
+    """A ``<picture>`` with an AVIF and WebP ``srcset`` per built width, and the original as fallback.
+
+    Extra keyword arguments become attributes of the ``<img>``.
+    """
+    entry = lookup(path)
+    if entry is None:
+        return format_html('<img src="{}" alt="{}"{}>', static(path), alt, _attributes(attrs))
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        (
+            (MIME_TYPES.get(name, f'image/{name}'),
+             ', '.join(f'{static(variant_path)} {width}w' for width, variant_path, _ in variants),
+             sizes)
+            for name, variants in entry['variants'].items()
+        ),
+    )
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}"{}></picture>',
+        sources, static(entry['source']), alt, _attributes(attrs),
+    )
+
+
+def _attributes(attrs):
+    return format_html_join('', ' {}="{}"', attrs.items())
@@ -1,3 +1,1120 @@
-from django.test import TestCase
+import gc
+import json
+import multiprocessing
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timezone
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from . import (
+    analytics, catalogue, images, metrics, pagecache, pipeline, profiling, routers, slowqueries, urls, versions,
+)
+from .leaderboard import refresh_user_score
+from .models import (
+    Choice, Module, Question, QuizAttempt, Scenario, ScenarioAttempt, ScenarioStep, UserModuleProgress,
+    UserAchievement, UserScenarioProgress, UserScore,
+)
+from .progress import SCENARIO_PASSING_SCORE, submit_quiz_score, submit_scenario_score
+from .quizbank import quiz_bundle
+from .scenariograph import scenario_graph
+from .staticfiles import StaticFilesMiddleware
+from .stats import UserStats, get_user_stats, load_user_stats
+
+FIXTURES = [
+    str(settings.BASE_DIR / name)
+    for name in ('addingdata.json', 'scenario_data.json', 'achievedata.json', 'questiondata.json', 'scenariograph.json')
+]
+
+# Tables that grow with the number of trainees; reading any of them
+# without an index is a bug. Modules, scenarios and achievements are a
+# handful of catalogue rows and may be scanned.
+HOT_TABLES = (
+    'training_usermoduleprogress', 'training_userscenarioprogress', 'training_userscore',
+    'training_userachievement', 'training_quizattempt', 'training_scenarioattempt',
+)
+
+
+def query_plan(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+class ProgressIndexTests(TestCase):
+    """Every query the pages and submissions issue against the per-trainee tables uses an index."""
+    fixtures = FIXTURES
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainee', password='secret')
+        for module in Module.objects.all()[:4]:
+            submit_quiz_score(cls.user, module, 80, 20)
+        submit_scenario_score(cls.user, Scenario.objects.first(), 60, 40)
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def assertNoTableScans(self, queries):
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            # Subqueries name their tables by alias in the plan
+            aliases = {alias: table for table, alias in re.findall(r'(?:FROM|JOIN) "(\w+)" (\w+)', sql)}
+            for step in query_plan(sql):
+                # "SCAN t USING [COVERING] INDEX" walks an index in order, a bare "SCAN t" reads the whole table
+                match = re.fullmatch(r'SCAN (\w+)', step)
+                if match and aliases.get(match.group(1), match.group(1)) in HOT_TABLES:
+                    self.fail(f"Table scan of {aliases.get(match.group(1), match.group(1))}:\n{sql}")
+            checked += 1
+        self.assertTrue(checked)
+
+    def test_pages_use_indexes(self):
+        for name in ('profile', 'leaderboard', 'leaderboard_api', 'achievements', 'modules'):
+            with self.subTest(page=name), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(f'/{name.replace("_", "/")}/').status_code, 200)
+            self.assertNoTableScans(queries)
+
+    def test_submissions_use_indexes(self):
+        module = Module.objects.last()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(f'/quiz/{module.slug}/', {'score': 70, 'time_spent': 25, 'module_slug': module.slug})
+            scenario = Scenario.objects.last()
+            self.client.post(f'/scenario/{scenario.slug}/', {'score': 50, 'time_spent': 30,
+                                                            'scenario_slug': scenario.slug})
+        self.assertNoTableScans(queries)
+
+    def test_progress_aggregates_are_index_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            refresh_user_score(self.user.pk)
+            load_user_stats(self.user)
+        steps = [step for query in queries for step in query_plan(query['sql'])]
+        self.assertIn('SEARCH training_usermoduleprogress USING COVERING INDEX moduleprogress_user_idx (user_id=?)', steps)
+        self.assertIn('SEARCH training_userscenarioprogress USING COVERING INDEX scenarioprogress_user_idx (user_id=?)', steps)
+        # The completed-module points subquery in load_user_stats
+        self.assertIn('SEARCH U0 USING COVERING INDEX moduleprogress_user_idx (user_id=?)', steps)
+
+
+class UserStatsTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user('trainee')
+
+    def test_loads_every_number_in_one_query(self):
+        modules = list(Module.objects.order_by('pk')[:3])
+        submit_quiz_score(self.user, modules[0], 100, 20)
+        submit_quiz_score(self.user, modules[1], 70, 60)
+        # Below the passing score, counts for points but not completion
+        submit_quiz_score(self.user, modules[2], 40, 60)
+        submit_scenario_score(self.user, Scenario.objects.first(), 80, 60)
+
+        with self.assertNumQueries(1):
+            stats = load_user_stats(self.user)
+        self.assertEqual(stats, UserStats(
+            user_id=self.user.pk, total_points=290, completed_modules=2, completed_scenarios=1,
+            # First Steps and Quick Thinker
+            achievement_count=2, completed_module_points=170, level='Intermediate',
+        ))
+        self.assertEqual(stats.accuracy, 85)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_user_stats(self.user), stats)
+
+    def test_cached_stats_move_on_after_a_submission(self):
+        module = Module.objects.first()
+        before = get_user_stats(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_stats(self.user), before)
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_quiz_score(self.user, module, 80, 30)
+        self.assertEqual(get_user_stats(self.user).total_points, before.total_points + 80)
+
+    def test_lost_version_is_never_reused(self):
+        cache, key = caches[settings.STATS_CACHE_ALIAS], 'test-version'
+        first = versions.current(cache, key)
+        versions.bump(cache, key)
+        self.assertEqual(versions.current(cache, key), first + 1)
+        cache.delete(key)
+        self.assertGreater(versions.current(cache, key), first + 1)
+
+
+class ScoreSubmissionTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        self.user = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(self.user)
+
+    def test_rejects_scores_out_of_range(self):
+        module = Module.objects.first()
+        scenario = Scenario.objects.first()
+        for score, time_spent in [(-5, 20), (module.max_score + 1, 20), (50, -1), (50, 10 ** 9)]:
+            response = self.client.post(f'/quiz/{module.slug}/',
+                                        {'score': score, 'time_spent': time_spent, 'module_slug': module.slug})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors)
+        for score in (-5, 101):
+            response = self.client.post(f'/scenario/{scenario.slug}/',
+                                        {'score': score, 'time_spent': 30, 'scenario_slug': scenario.slug})
+            self.assertEqual(response.status_code, 200)
+        self.assertFalse(QuizAttempt.objects.filter(user=self.user).exists())
+        self.assertFalse(UserScenarioProgress.objects.filter(user=self.user).exists())
+
+        self.client.post(f'/quiz/{module.slug}/', {'score': module.max_score, 'time_spent': 20, 'module_slug': module.slug})
+        self.assertEqual(UserModuleProgress.objects.get(user=self.user, module=module).score, module.max_score)
+
+    def test_announces_unlocked_achievements(self):
+        module = Module.objects.first()
+        data = {'score': module.max_score, 'time_spent': 20, 'module_slug': module.slug}
+        response = self.client.post(f'/quiz/{module.slug}/', data, follow=True)
+        self.assertContains(response, 'Achievement Unlocked: First Steps!')
+        self.assertContains(response, 'Achievement Unlocked: Quick Thinker!')
+        # Only once
+        response = self.client.post(f'/quiz/{module.slug}/', data, follow=True)
+        self.assertNotContains(response, 'Achievement Unlocked')
+
+    def test_scenario_submission_announces_unlocked_achievements(self):
+        for module in Module.objects.all():
+            submit_quiz_score(self.user, module, 95, 60)
+        scenario = Scenario.objects.first()
+        url = reverse('scenario', kwargs={'slug': scenario.slug})
+        # 950 module points, the scenario takes the total past Expert Medic's 1000
+        data = {'score': 60, 'time_spent': 30, 'scenario_slug': scenario.slug}
+        self.assertContains(self.client.post(url, data, follow=True), 'Achievement Unlocked: Expert Medic!')
+        response = self.client.post(url, {**data, 'score': 80}, follow=True)
+        self.assertNotContains(response, 'Achievement Unlocked')
+
+    def test_rules_unlock_once_when_their_counter_crosses_the_threshold(self):
+        def titles(unlocked):
+            return [achievement.title for achievement in unlocked]
+        modules = list(Module.objects.order_by('pk'))
+        self.assertEqual([titles(submit_quiz_score(self.user, module, 80, 60)) for module in modules],
+                         [['First Steps']] + [[]] * 8 + [['Life Saver']])
+        # Still ten completed modules, 990 points
+        self.assertEqual([titles(submit_quiz_score(self.user, module, 100, 60)) for module in modules[1:]],
+                         [[]] * 9)
+        self.assertEqual(titles(submit_quiz_score(self.user, modules[0], 100, 60)), ['Expert Medic'])
+        self.assertEqual(titles(submit_quiz_score(self.user, modules[0], 100, 60)), [])
+        self.assertEqual(
+            sorted(UserAchievement.objects.filter(user=self.user).values_list('achievement__title', flat=True)),
+            ['Expert Medic', 'First Steps', 'Life Saver'],
+        )
+
+
+class AttemptAnalyticsTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        # A catalogue record, as the rest of the app passes them
+        self.module = catalogue.module_or_404('burns_quiz')
+        self.start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        self.end = datetime(2026, 4, 1, tzinfo=timezone.utc)
+
+    def attempt(self, user, month, day, score):
+        QuizAttempt.objects.create(user=user, module_id=self.module.pk, score=score, time_spent=30,
+                                   created_at=datetime(2026, month, day, 12, tzinfo=timezone.utc))
+
+    def test_learning_curve_follows_trainees_who_started_in_range(self):
+        veteran, first, second = (User.objects.create_user(name) for name in ('veteran', 'first', 'second'))
+        # Started before the range, so not in the curve
+        self.attempt(veteran, 2, 20, 10)
+        self.attempt(veteran, 3, 2, 40)
+        self.attempt(first, 3, 3, 20)
+        self.attempt(first, 3, 10, 50)
+        # After the range, still the third attempt of a trainee who started in it
+        self.attempt(first, 4, 5, 90)
+        self.attempt(second, 3, 3, 40)
+        self.attempt(second, 3, 4, 70)
+
+        self.assertEqual(analytics.learning_curve(self.module, self.start, self.end),
+                         [(1, 30.0, 2), (2, 60.0, 2), (3, 90.0, 1)])
+        self.assertEqual(analytics.learning_curve(self.module, self.start, self.end, max_attempts=1),
+                         [(1, 30.0, 2)])
+
+    def test_attempt_series(self):
+        trainee, other = User.objects.create_user('trainee'), User.objects.create_user('other')
+        self.attempt(trainee, 2, 28, 100)
+        self.attempt(trainee, 3, 3, 20)
+        self.attempt(other, 3, 3, 80)
+        self.attempt(trainee, 3, 4, 70)
+
+        series = analytics.module_attempt_series(self.module, self.start, self.end)
+        self.assertEqual([(row['period'], row['attempts'], row['trainees'], row['avg_score'], row['best_score'],
+                           row['passed']) for row in series],
+                         [(date(2026, 3, 3), 2, 2, 50.0, 80, 1), (date(2026, 3, 4), 1, 1, 70.0, 70, 1)])
+        self.assertEqual([row['attempts'] for row in
+                          analytics.module_attempt_series(self.module, self.start, self.end, 'month')], [3])
+        with self.assertRaises(ValueError):
+            analytics.module_attempt_series(self.module, self.start, self.end, 'year')
+
+        scenario = catalogue.scenario_or_404('burns_scenario')
+        ScenarioAttempt.objects.create(user=trainee, scenario_id=scenario.pk, score=SCENARIO_PASSING_SCORE,
+                                       created_at=datetime(2026, 3, 9, tzinfo=timezone.utc))
+        [row] = analytics.scenario_attempt_series(scenario, self.start, self.end, 'week')
+        self.assertEqual((row['attempts'], row['passed']), (1, 1))
+
+    def test_report_command(self):
+        trainee = User.objects.create_user('trainee')
+        submit_quiz_score(trainee, self.module, 50, 30)
+        submit_quiz_score(trainee, self.module, 80, 30)
+        out = StringIO()
+        call_command('attempt_report', 'burns_quiz', stdout=out)
+        self.assertIn('2 attempts', out.getvalue())
+        self.assertIn('attempt  2  avg  80.0      1 trainees', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('attempt_report', 'no_such_quiz')
+
+
+class BackfillAchievementsTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        # Progress written behind the rules engine's back, as before it existed
+        self.starter, self.expert = User.objects.create_user('starter'), User.objects.create_user('expert')
+        modules = list(Module.objects.all())
+        UserModuleProgress.objects.bulk_create(
+            [UserModuleProgress(user=self.starter, module=modules[0], score=70, completed=True, attempts=1)]
+            + [UserModuleProgress(user=self.expert, module=module, score=100, completed=True, attempts=1,
+                                  time_spent=20) for module in modules]
+        )
+
+    def backfill(self, **options):
+        out = StringIO()
+        call_command('backfill_achievements', stdout=out, **options)
+        return out.getvalue()
+
+    def earned(self, user):
+        return sorted(UserAchievement.objects.filter(user=user).values_list('achievement__title', flat=True))
+
+    def test_awards_once(self):
+        output = self.backfill(rebuild_scores=True, chunk_size=1)
+        self.assertEqual(self.earned(self.starter), ['First Steps'])
+        self.assertEqual(self.earned(self.expert), ['Expert Medic', 'First Steps', 'Life Saver', 'Quick Thinker'])
+        # Rules whose achievement is not in the fixtures
+        self.assertIn("Skipping 'All Star': no Achievement row with that title.", output)
+        self.assertIn('Evaluated 4 rules for 2 users', output)
+        self.assertIn('5 achievements unlocked', output)
+        self.assertIn("The 'stats' cache is local to each process", output)
+
+        output = self.backfill()
+        self.assertIn('Evaluated 4 rules for 2 users', output)
+        self.assertIn(': 0 achievements unlocked', output)
+        self.assertNotIn('local to each process', output)
+        self.assertEqual(UserAchievement.objects.count(), 5)
+
+    def test_rejects_chunk_size(self):
+        with self.assertRaises(CommandError):
+            self.backfill(chunk_size=0)
+
+
+@override_settings(LEADERBOARD_PAGE_SIZE=3, LEADERBOARD_WINDOW=1)
+class LeaderboardTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        # Three trainees tied on 200 points, ordered by user id
+        self.users = {}
+        for name, points in [('ann', 300), ('ben', 200), ('cat', 200), ('dan', 200), ('eve', 100), ('fay', 50)]:
+            self.users[name] = User.objects.create_user(name)
+            UserScore.objects.update_or_create(user=self.users[name], defaults={'total_points': points})
+        self.client.force_login(self.users['dan'])
+
+    def ranks(self, entries):
+        return [(entry['username'], entry['rank']) for entry in entries]
+
+    def api(self, page=None):
+        response = self.client.get(reverse('leaderboard_api'), {'page': page} if page is not None else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_tied_totals_share_a_rank_across_pages(self):
+        data = self.api()
+        self.assertEqual((data['page'], data['num_pages']), (1, 2))
+        self.assertEqual(self.ranks(data['leaderboard']), [('ann', 1), ('ben', 2), ('cat', 2)])
+        self.assertEqual(self.ranks(self.api(2)['leaderboard']), [('dan', 2), ('eve', 5), ('fay', 6)])
+
+    def test_window_and_next_rank(self):
+        data = self.api()
+        self.assertEqual(self.ranks(data['window']), [('cat', 2), ('dan', 2), ('eve', 5)])
+        self.assertEqual((data['current_rank'], data['total_points'], data['next_rank_points']), (2, 200, 100))
+
+        self.client.force_login(self.users['ann'])
+        data = self.api()
+        # Nobody ahead: no one above in the window and nothing to catch up
+        self.assertEqual(self.ranks(data['window']), [('ann', 1), ('ben', 2)])
+        self.assertEqual((data['current_rank'], data['next_rank_points']), (1, 0))
+
+        self.client.force_login(self.users['fay'])
+        self.assertEqual(self.ranks(self.api()['window']), [('eve', 5), ('fay', 6)])
+
+    def test_invalid_or_out_of_range_page(self):
+        self.assertEqual(self.api('abc')['page'], 1)
+        self.assertEqual(self.api(0)['page'], 2)
+        self.assertEqual(self.api(99)['page'], 2)
+        response = self.client.get(reverse('leaderboard'), {'page': 99})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['rank'] for entry in response.context['leaderboard']], [2, 5, 6])
+        self.assertEqual(response.context['current_rank'], 2)
+
+
+def dead_pid():
+    """The pid of a process that has exited."""
+    child = subprocess.Popen([sys.executable, '-c', ''])
+    child.wait()
+    return child.pid
+
+
+class SubmissionRecoveryTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool_dir = Path(directory.name)
+        self.user = User.objects.create_user('trainee', password='secret')
+        self.module = Module.objects.first()
+
+    def write_orphan(self, count, torn=False):
+        path = self.spool_dir / f'submissions-{dead_pid()}.jsonl'
+        records = [{'kind': pipeline.QUIZ, 'user': self.user.pk, 'item': self.module.pk, 'score': 50 + n,
+                    'time_spent': 30, 'submitted_at': time.time()} for n in range(count)]
+        path.write_text(''.join(json.dumps(record) + '\n' for record in records) + ('{"kind": "qu' if torn else ''))
+        return path
+
+    def test_replays_orphaned_spool(self):
+        orphan = self.write_orphan(3, torn=True)
+        buffer = pipeline.SubmissionBuffer(self.spool_dir)
+        with self.assertLogs('training.pipeline', 'WARNING'):
+            buffer._recover_orphans()
+        self.assertFalse(orphan.exists())
+        # Held in this process's own spool until written
+        self.assertEqual(len(buffer.spool_path.read_text().splitlines()), 3)
+
+        buffer.flush()
+        self.assertEqual(QuizAttempt.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(UserModuleProgress.objects.get(user=self.user, module=self.module).score, 52)
+        self.assertEqual(list(self.spool_dir.iterdir()), [])
+
+    def test_orphans_are_replayed_once(self):
+        for _ in range(40):
+            self.write_orphan(5)
+        # Workers starting together, each in its own process
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(4)
+        results = context.Queue()
+
+        def recover():
+            buffer = pipeline.SubmissionBuffer(self.spool_dir)
+            barrier.wait()
+            try:
+                buffer._recover_orphans()
+                results.put(len(buffer._pending))
+            except Exception as exc:
+                results.put(repr(exc))
+
+        workers = [context.Process(target=recover) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        replayed = [results.get(timeout=30) for _ in workers]
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sum(replayed), 200, replayed)
+        # Every record is in exactly one worker's spool, the orphans and claims are gone
+        spools = list(self.spool_dir.iterdir())
+        self.assertTrue(all(path.name.startswith('submissions-') for path in spools))
+        self.assertEqual(sum(len(path.read_text().splitlines()) for path in spools), 200)
+
+    def test_skips_spools_of_live_workers(self):
+        live = self.spool_dir / f'submissions-{os.getppid()}.jsonl'
+        live.write_text('{}\n')
+        buffer = pipeline.SubmissionBuffer(self.spool_dir)
+        buffer._recover_orphans()
+        self.assertTrue(live.exists())
+        self.assertEqual(buffer._pending, [])
+
+    def test_forked_worker_starts_its_own_buffer(self):
+        # Started before the fork, like an app preloaded by the server
+        parent = pipeline.SubmissionBuffer(self.spool_dir)
+        parent.start()
+        self.addCleanup(parent.stop)
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+
+        def worker():
+            buffer = pipeline.submission_buffer()
+            results.put((buffer is parent, buffer.pid, buffer.spool_path.name, buffer._thread.is_alive()))
+
+        with override_settings(SUBMISSION_BUFFER={'SPOOL_DIR': self.spool_dir}), \
+                mock.patch.object(pipeline, '_buffer', parent):
+            process = context.Process(target=worker)
+            process.start()
+            result = results.get(timeout=30)
+            process.join()
+            self.assertIs(pipeline.submission_buffer(), parent)
+        self.assertEqual(result, (False, process.pid, f'submissions-{process.pid}.jsonl', True))
+
+
+@override_settings(REPLICA_DATABASES=['replica0', 'replica1'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def reads(self, request):
+        """The database each of a few reads goes to while ``replica_reads`` runs a view."""
+        @routers.replica_reads
+        def view(request):
+            return [self.router.db_for_read(model) for model in (Module, UserModuleProgress, Module, User)]
+        return view(request)
+
+    def get(self, session=None):
+        request = self.factory.get('/')
+        request.session = session if session is not None else {}
+        return request
+
+    def test_request_reads_from_one_replica(self):
+        seen = set()
+        for _ in range(20):
+            databases = self.reads(self.get())
+            self.assertEqual(len(set(databases)), 1, databases)
+            seen.add(databases[0])
+        self.assertEqual(seen, {'replica0', 'replica1'})
+        # Outside a replica_reads view
+        self.assertEqual(self.router.db_for_read(Module), 'default')
+
+    def test_sessions_and_writes_use_primary(self):
+        @routers.replica_reads
+        def view(request):
+            return self.router.db_for_read(Session), self.router.db_for_write(Module)
+        self.assertEqual(view(self.get()), ('default', 'default'))
+
+    def test_pinned_to_primary_after_post(self):
+        request = self.factory.post('/')
+        request.session = {}
+        self.assertEqual(set(self.reads(request)), {'default'})
+        routers.ReplicaRoutingMiddleware(lambda request: HttpResponse())(request)
+
+        # The next page views of that session read their own writes
+        self.assertEqual(set(self.reads(self.get(request.session))), {'default'})
+        with override_settings(READ_YOUR_WRITES_SECONDS=0):
+            routers.pin_to_primary(request)
+        self.assertNotEqual(set(self.reads(self.get(request.session))), {'default'})
+
+    def test_no_replicas_reads_primary(self):
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertEqual(set(self.reads(self.get())), {'default'})
+
+    def test_catalogue_and_bundles_read_primary(self):
+        module = Module.objects.create(title='Drowning', slug='drowning_quiz')
+        scenario = Scenario.objects.create(title='Flood', slug='flood_scenario')
+        catalogue.invalidate_catalogue()
+
+        @routers.replica_reads
+        def view(request):
+            # The replica aliases are not configured here, so any routed read would fail
+            current = catalogue.catalogue()
+            return current, quiz_bundle(current.modules[module.pk]), scenario_graph(current.scenarios[scenario.pk])
+        current, bundle, graph = view(self.get())
+        self.assertEqual(current.modules[module.pk].slug, 'drowning_quiz')
+        self.assertEqual(bundle.module, 'drowning_quiz')
+        self.assertEqual(graph.scenario, 'flood_scenario')
+
+    def test_migrations_and_relations(self):
+        self.assertTrue(self.router.allow_migrate('default', 'training'))
+        self.assertFalse(self.router.allow_migrate('replica0', 'training'))
+        module, progress = Module(), UserModuleProgress()
+        module._state.db, progress._state.db = 'replica1', 'default'
+        self.assertTrue(self.router.allow_relation(module, progress))
+        progress._state.db = 'elsewhere'
+        self.assertFalse(self.router.allow_relation(module, progress))
+
+# Size of the seeded population; CI runs the default, set PERF_USERS=50000
+# to check the budgets against a production-sized table
+PERF_USERS = int(os.environ.get('PERF_USERS', 2000))
+PERF_REPEAT = int(os.environ.get('PERF_REPEAT', 20))
+# Scales every latency budget, for slow or shared CI machines
+PERF_TIME_FACTOR = float(os.environ.get('PERF_TIME_FACTOR', 1))
+
+# url name: (max queries, p95 milliseconds) for a logged-in trainee with a
+# cold stats cache who has attempted every module and scenario
+VIEW_BUDGETS = {
+    'home': (2, 50),
+    'modules': (3, 100),
+    'scenarios': (2, 50),
+    'achievements': (3, 100),
+    'leaderboard': (12, 150),
+    'leaderboard_api': (12, 150),
+    'profile': (3, 100),
+    'register': (0, 50),
+    'login': (0, 50),
+    'logout': (4, 50),
+    'quiz_bundle': (0, 100),
+    'scenario_graph': (0, 100),
+    'metrics': (2, 100),
+}
+# Pages only staff can see, measured with a staff member logged in instead
+STAFF_PAGES = {'metrics'}
+LEARNING_PAGE_BUDGET = (2, 50)
+QUIZ_BUDGET = (3, 100)
+SCENARIO_BUDGET = (3, 100)
+QUIZ_SUBMISSION_BUDGET = (9, 200)
+SCENARIO_SUBMISSION_BUDGET = (12, 200)
+
+
+def seed_trainees(count, seed=42):
+    """Create ``count`` trainees with a random spread of progress, attempts, scores and achievements."""
+    rng = random.Random(seed)
+    modules = list(Module.objects.all())
+    scenarios = list(Scenario.objects.all())
+    password = make_password('secret')
+    User.objects.bulk_create(
+        [User(username=f'seed{n}', password=password) for n in range(count)], batch_size=2000,
+    )
+    module_rows, scenario_rows, attempts = [], [], []
+    for user_id in User.objects.filter(username__startswith='seed').values_list('pk', flat=True).iterator():
+        for module in rng.sample(modules, rng.randint(0, len(modules))):
+            score = rng.randint(0, 100)
+            module_rows.append(UserModuleProgress(
+                user_id=user_id, module=module, score=score, completed=score >= module.passing_score,
+                attempts=rng.randint(1, 4), time_spent=rng.randint(10, 300),
+            ))
+            attempts.append(QuizAttempt(user_id=user_id, module=module, score=score))
+        for scenario in rng.sample(scenarios, rng.randint(0, len(scenarios))):
+            score = rng.randint(0, 100)
+            scenario_rows.append(UserScenarioProgress(
+                user_id=user_id, scenario=scenario, score=score, completed=score >= SCENARIO_PASSING_SCORE, attempts=1,
+                time_spent=rng.randint(10, 300),
+            ))
+    UserModuleProgress.objects.bulk_create(module_rows, batch_size=2000)
+    UserScenarioProgress.objects.bulk_create(scenario_rows, batch_size=2000)
+    QuizAttempt.objects.bulk_create(attempts, batch_size=2000)
+    call_command('backfill_achievements', rebuild_scores=True, stdout=StringIO())
+
+
+class ViewBudgetTests(TestCase):
+    """Query-count and latency budgets for every page in ``training.urls``.
+
+    A view that starts issuing a query per row (like ``modules`` loading
+    each completed module) or reading a table that grows with the number
+    of trainees will blow its budget here before it reaches production.
+    """
+    fixtures = FIXTURES
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_trainees(PERF_USERS)
+        cls.user = User.objects.create_user('perf', password='secret')
+        cls.staff = User.objects.create_user('perf-staff', password='secret', is_staff=True)
+        for module in Module.objects.all():
+            submit_quiz_score(cls.user, module, 90, 25)
+        for scenario in Scenario.objects.all():
+            submit_scenario_score(cls.user, scenario, 70, 60)
+
+    def setUp(self):
+        caches[settings.STATS_CACHE_ALIAS].clear()
+        # Loaded once per process, budgets are for the steady state
+        for module in catalogue.modules().values():
+            quiz_bundle(module)
+        for scenario in catalogue.scenarios().values():
+            scenario_graph(scenario)
+        self.client.force_login(self.user)
+
+    def budget_for(self, pattern):
+        if pattern.name in VIEW_BUDGETS:
+            return VIEW_BUDGETS[pattern.name]
+        if pattern.callback.__name__ == 'quiz':
+            return QUIZ_BUDGET
+        if pattern.callback.__name__ == 'scenario':
+            return SCENARIO_BUDGET
+        if pattern.name.endswith('_learning'):
+            return LEARNING_PAGE_BUDGET
+        self.fail(f"No budget for the '{pattern.name}' page, add one to VIEW_BUDGETS")
+
+    def url_for(self, pattern):
+        if pattern.name == 'quiz_bundle':
+            module = Module.objects.first()
+            return reverse(pattern.name, args=[module.slug, quiz_bundle(module).version])
+        if pattern.name == 'scenario_graph':
+            scenario = catalogue.scenario_or_404(Scenario.objects.first().slug)
+            return reverse(pattern.name, args=[scenario.slug, scenario_graph(scenario).version])
+        if 'slug' in pattern.pattern.converters:
+            model = Module if pattern.callback.__name__ == 'quiz' else Scenario
+            return reverse(pattern.name, kwargs={'slug': model.objects.first().slug})
+        return reverse(pattern.name)
+
+    def p95_ms(self, request, user):
+        # Whatever earlier tests left for the collector is not this page's cost
+        gc.collect()
+        timings = []
+        for _ in range(PERF_REPEAT):
+            caches[settings.STATS_CACHE_ALIAS].clear()
+            self.client.force_login(user)
+            started = time.perf_counter()
+            request()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+
+    def assertWithinBudget(self, label, budget, request, user=None):
+        max_queries, p95_budget = budget
+        user = user or self.user
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{label} ran {len(queries)} queries, budget {max_queries}:\n"
+            + "\n".join(query['sql'] for query in queries),
+        )
+        p95 = self.p95_ms(request, user)
+        self.assertLessEqual(p95, p95_budget * PERF_TIME_FACTOR, f"{label} p95 {p95:.1f}ms, budget {p95_budget}ms")
+
+    def test_pages(self):
+        patterns = [pattern for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)]
+        for pattern in patterns:
+            url = self.url_for(pattern)
+            user = self.staff if pattern.name in STAFF_PAGES else self.user
+            with self.subTest(url=url):
+                caches[settings.STATS_CACHE_ALIAS].clear()
+                self.client.force_login(user)
+                if pattern.name in STAFF_PAGES:
+                    # The page itself, not the redirect to the login page
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertWithinBudget(url, self.budget_for(pattern), lambda: self.client.get(url), user)
+
+    def test_quiz_submission(self):
+        module = Module.objects.last()
+        url = reverse('quiz', kwargs={'slug': module.slug})
+        self.assertWithinBudget(url, QUIZ_SUBMISSION_BUDGET, lambda: self.client.post(
+            url, {'score': 75, 'time_spent': 40, 'module_slug': module.slug},
+        ))
+
+    def test_scenario_submission(self):
+        scenario = Scenario.objects.last()
+        url = reverse('scenario', kwargs={'slug': scenario.slug})
+        self.assertWithinBudget(url, SCENARIO_SUBMISSION_BUDGET, lambda: self.client.post(
+            url, {'score': 80, 'time_spent': 50, 'scenario_slug': scenario.slug},
+        ))
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.PAGE_CACHE_ALIAS].clear()
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(IMAGE_OUTPUT_DIR=Path(directory.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = reverse('burns_learning')
+
+    def test_asset_builds_change_the_etag(self):
+        first = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        # build_images wrote a new image manifest
+        (settings.IMAGE_OUTPUT_DIR / images.MANIFEST_NAME).write_text('{}')
+        after_build = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(after_build.status_code, 200)
+        self.assertNotEqual(after_build['ETag'], first['ETag'])
+
+        # collectstatic wrote a new staticfiles manifest, picked up by the next process
+        with mock.patch.object(pagecache, '_static_manifest', return_value=('f00d', 0)):
+            after_collect = self.client.get(self.url, HTTP_IF_NONE_MATCH=after_build['ETag'])
+        self.assertEqual(after_collect.status_code, 200)
+        self.assertNotEqual(after_collect['ETag'], after_build['ETag'])
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        for name, content in [('app.css', 'plain'), ('app.css.gz', 'gzip'), ('app.css.br', 'brotli')]:
+            (root / name).write_text(content)
+        override = override_settings(STATIC_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+
+    def fetch(self, accept_encoding):
+        request = RequestFactory().get(settings.STATIC_URL + 'app.css', HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = self.middleware(request)
+        return response.get('Content-Encoding'), b''.join(response.streaming_content).decode()
+
+    def test_serves_accepted_encoding(self):
+        self.assertEqual(self.fetch('gzip, deflate, br'), ('br', 'brotli'))
+        self.assertEqual(self.fetch('gzip'), ('gzip', 'gzip'))
+        self.assertEqual(self.fetch(''), (None, 'plain'))
+        # Refused codings and look-alikes are not accepted
+        self.assertEqual(self.fetch('br;q=0, gzip'), ('gzip', 'gzip'))
+        self.assertEqual(self.fetch('gzip;q=0, br;q=0'), (None, 'plain'))
+        self.assertEqual(self.fetch('x-brotli, gzipped'), (None, 'plain'))
+        # q-values rank the codings, a wildcard covers the unnamed ones
+        self.assertEqual(self.fetch('br;q=0.5, gzip;q=0.8'), ('gzip', 'gzip'))
+        self.assertEqual(self.fetch('*'), ('br', 'brotli'))
+        self.assertEqual(self.fetch('br;q=0, *;q=0.1'), ('gzip', 'gzip'))
+
+
+class QuizBundleTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        self.module = Module.objects.get(slug='burns_quiz')
+
+    def test_bundle_matches_question_bank(self):
+        bundle = quiz_bundle(self.module)
+        response = self.client.get(reverse('quiz_bundle', args=[self.module.slug, bundle.version]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        data = response.json()
+        self.assertEqual(data['version'], bundle.version)
+        self.assertEqual(len(data['questions']), self.module.questions.count())
+        first = data['questions'][0]
+        self.assertEqual(first['question'], 'What is the first step when treating a minor burn?')
+        self.assertEqual([option['isCorrect'] for option in first['options']], [True, False, False])
+
+        revalidated = self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_editing_a_question_changes_the_version(self):
+        old_version = quiz_bundle(self.module).version
+        choice = Choice.objects.filter(question__module=self.module).first()
+        choice.text = 'Cool the burn under running water'
+        choice.save()
+        new_version = quiz_bundle(self.module).version
+        self.assertNotEqual(new_version, old_version)
+
+        response = self.client.get(reverse('quiz_bundle', args=[self.module.slug, old_version]))
+        self.assertRedirects(
+            response, reverse('quiz_bundle', args=[self.module.slug, new_version]), fetch_redirect_response=False,
+        )
+
+    def test_quiz_page_links_current_bundle(self):
+        user = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(user)
+        Question.objects.filter(module=self.module, order=5).delete()
+        response = self.client.get(reverse('quiz', kwargs={'slug': self.module.slug}))
+        url = reverse('quiz_bundle', args=[self.module.slug, quiz_bundle(self.module).version])
+        self.assertContains(response, url)
+        self.assertEqual(len(self.client.get(url).json()['questions']), 4)
+
+
+    def test_module_without_quiz_page_is_not_found(self):
+        user = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(user)
+        Module.objects.create(title='Drowning', slug='drowning_quiz')
+        self.assertEqual(self.client.get(reverse('quiz', kwargs={'slug': 'drowning_quiz'})).status_code, 404)
+        response = self.client.post(reverse('quiz', kwargs={'slug': 'drowning_quiz'}),
+                                    {'score': 10, 'time_spent': 20, 'module_slug': 'drowning_quiz'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_scenario_without_page_is_not_found(self):
+        user = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(user)
+        Scenario.objects.create(title='Flood', slug='flood_scenario')
+        url = reverse('scenario', kwargs={'slug': 'flood_scenario'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.client.post(url, {'score': 80, 'time_spent': 20, 'scenario_slug': 'flood_scenario'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(UserScenarioProgress.objects.filter(user=user).exists())
+
+
+class ScenarioGraphTests(TestCase):
+    fixtures = FIXTURES
+
+    def graph(self, slug):
+        scenario = catalogue.scenario_or_404(slug)
+        response = self.client.get(reverse('scenario_graph', args=[slug, scenario_graph(scenario).version]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        return response.json()
+
+    def test_every_step_is_reachable_and_every_ending_scores(self):
+        for scenario in Scenario.objects.all():
+            with self.subTest(scenario=scenario.slug):
+                graph = self.graph(scenario.slug)
+                steps = graph['steps']
+                self.assertEqual(graph['timeLimit'], scenario.time_limit)
+                self.assertIn(graph['start'], steps)
+                self.assertIn(graph['timeout'], steps)
+
+                seen, pending = {graph['start'], graph['timeout']}, [graph['start']]
+                while pending:
+                    for option in steps[pending.pop()].get('options', []):
+                        if option['next'] not in seen:
+                            seen.add(option['next'])
+                            pending.append(option['next'])
+                self.assertEqual(seen, set(steps))
+                for key, step in steps.items():
+                    if not step.get('options'):
+                        self.assertIn('score', step, f"ending '{key}' has no score")
+
+    def test_steps_list_the_images_that_follow(self):
+        steps = self.graph('burns_scenario')['steps']
+        start = steps['start']
+        next_images = {steps[option['next']]['image'] for option in start['options']}
+        self.assertEqual(set(start['preload']), next_images)
+        self.assertEqual(len(start['preload']), len(next_images))
+        self.assertIn(steps['call-help']['image'], start['prefetch'])
+        self.assertNotIn(start['image'], start['preload'] + start['prefetch'])
+        # Endings have nothing left to fetch
+        self.assertNotIn('preload', steps['flour'])
+
+    def test_editing_a_step_changes_the_version(self):
+        scenario = catalogue.scenario_or_404('hiking_scenario')
+        old_version = scenario_graph(scenario).version
+        step = ScenarioStep.objects.get(scenario__slug='hiking_scenario', key='start')
+        step.heading = 'Where to?'
+        step.save()
+        new_version = scenario_graph(scenario).version
+        self.assertNotEqual(new_version, old_version)
+        self.assertEqual(self.graph('hiking_scenario')['steps']['start']['heading'], 'Where to?')
+
+        user = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('scenario', kwargs={'slug': 'hiking_scenario'}))
+        self.assertContains(response, reverse('scenario_graph', args=['hiking_scenario', new_version]))
+
+
+class MetricsTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        metrics.registry = metrics.Registry()
+        self.staff = User.objects.create_user('staff', password='secret', is_staff=True)
+
+    def scrape(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_records_each_view(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.client.get(reverse('modules'))
+        self.client.get(reverse('modules'))
+        self.client.get('/no-such-page/')
+
+        body = self.scrape()
+        self.assertIn('training_requests_total{view="modules",status="200"} 2', body)
+        self.assertIn('training_requests_total{view="<unmatched>",status="404"} 1', body)
+        self.assertIn('training_request_duration_seconds_count{view="modules"} 2', body)
+        self.assertIn('training_sql_queries_bucket{view="modules",le="+Inf"} 2', body)
+        # The modules page renders a template and runs at least one query
+        series = dict(re.findall(r'^(training_\w+\{view="modules"\}) (\S+)$', body, re.M))
+        self.assertGreater(float(series['training_template_duration_seconds_sum{view="modules"}']), 0)
+        self.assertGreater(float(series['training_sql_queries_sum{view="modules"}']), 0)
+        self.assertGreater(float(series['training_response_size_bytes_sum{view="modules"}']), 1000)
+
+    def test_only_staff_can_scrape(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    def test_adds_up_every_worker(self):
+        with TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            buckets = len(metrics.HISTOGRAMS['sql_queries'][1]) + 1
+            series = {'buckets': [0, 3] + [0] * (buckets - 2), 'sum': 3, 'count': 3}
+            other_worker = {'histograms': {'sql_queries': {'modules': series}}, 'requests': {'modules|200': 3}}
+            Path(directory, 'other-worker.json').write_text(json.dumps(other_worker))
+            self.client.get(reverse('home'))
+
+            body = self.scrape()
+            self.assertIn('training_requests_total{view="modules",status="200"} 3', body)
+            self.assertIn('training_requests_total{view="home",status="200"} 1', body)
+            self.assertIn('training_sql_queries_count{view="modules"} 3', body)
+            self.assertEqual(len(list(Path(directory).glob('*.json'))), 2)
+
+    def test_reports_submission_buffer(self):
+        self.assertNotIn('training_submission_queue_depth', self.scrape())
+
+        module = Module.objects.first()
+        with TemporaryDirectory() as spool_dir, TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            buffer = pipeline.SubmissionBuffer(spool_dir)
+            for score in (40, 50, 60):
+                buffer.submit_quiz(self.staff.pk, module, score, 30)
+            buffer.flush()
+            buffer.submit_quiz(self.staff.pk, module, 70, 30)
+            other_worker = {
+                'histograms': {}, 'requests': {},
+                'submission_buffer': {'queue_depth': 2, 'enqueued_total': 5, 'flushed_total': 3, 'failed_total': 0,
+                                      'flush_count': 2, 'total_flush_ms': 30.0, 'max_flush_ms': 1500.0},
+            }
+            Path(directory, 'other-worker.json').write_text(json.dumps(other_worker))
+
+            with mock.patch.object(pipeline, '_buffer', buffer):
+                body = self.scrape()
+        self.assertIn('# TYPE training_submission_queue_depth gauge', body)
+        self.assertIn('training_submission_queue_depth 3', body)
+        self.assertIn('training_submissions_enqueued_total 9', body)
+        self.assertIn('training_submissions_flushed_total 6', body)
+        self.assertIn('training_submission_flushes_total 3', body)
+        self.assertIn('training_submission_flush_max_seconds 1.5', body)
+        flush_seconds = float(re.search(r'^training_submission_flush_seconds_total (\S+)$', body, re.M)[1])
+        self.assertGreater(flush_seconds, 0.03)
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        config = {**settings.PROFILING, 'DIR': self.directory, 'TOKEN': 'letmein', 'INTERVAL_MS': 1}
+        override = override_settings(PROFILING=config)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sampler_records_the_running_function(self):
+        sampler = profiling.Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        _spin(0.05)
+        stacks = sampler.stop()
+        self.assertGreater(sum(stacks.values()), 0)
+        self.assertTrue(any(stack.endswith(f'_spin (training/tests.py:{_spin.__code__.co_firstlineno})')
+                            for stack in stacks))
+
+    def test_profiles_only_requests_that_ask(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.assertNotIn(profiling.SAMPLES_HEADER, self.client.get(reverse('modules')))
+        self.assertNotIn(profiling.SAMPLES_HEADER, self.client.get(reverse('modules'), headers={'X-Profile': 'nope'}))
+        # A trainee cannot turn it on
+        self.assertNotIn(profiling.SAMPLES_HEADER, self.client.get(reverse('modules') + '?profile=1'))
+
+        # A page takes a few milliseconds, try a few times for a sample
+        for _ in range(50):
+            response = self.client.get(reverse('modules'), headers={'X-Profile': 'letmein'})
+            self.assertIn(profiling.SAMPLES_HEADER, response)
+            if int(response[profiling.SAMPLES_HEADER]):
+                break
+        lines = (self.directory / 'modules.folded').read_text().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            # Stacks start at the middleware below the profiler, not in the test client or server
+            self.assertTrue(stack.startswith('inner (django/core/handlers/exception.py'), stack)
+
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn(profiling.SAMPLES_HEADER, self.client.get(reverse('modules') + '?profile=1'))
+
+    def test_rotates_and_merges(self):
+        with override_settings(PROFILING={**settings.PROFILING, 'MAX_BYTES': 20, 'BACKUP_COUNT': 2}):
+            for _ in range(4):
+                profiling.store('modules', {'a;b': 2, 'a;c': 1})
+            profiling.store('admin:index', {'a;b': 5})
+        self.assertEqual(
+            sorted(path.name for path in self.directory.iterdir()),
+            ['admin.index.folded', 'modules.folded', 'modules.folded.1', 'modules.folded.2'],
+        )
+
+        output = self.directory / 'merged.txt'
+        stderr = StringIO()
+        call_command('merge_profiles', output=str(output), stderr=stderr)
+        # The oldest file was rotated away, three of the four requests are left
+        self.assertEqual(output.read_text(), 'a;b 11\na;c 3\n')
+        self.assertIn('9 samples  modules', stderr.getvalue())
+
+        call_command('merge_profiles', 'modules', '--current-only', '--prefix-view', output=str(output), stderr=stderr)
+        self.assertEqual(output.read_text(), 'modules;a;b 2\nmodules;a;c 1\n')
+
+
+class SlowQueryLogTests(TestCase):
+    fixtures = FIXTURES
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = Path(directory.name, 'slow.jsonl')
+        # Every query counts as slow
+        override = override_settings(SLOW_QUERY_LOG=self.log, SLOW_QUERY_MS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_logs_query_with_plan_and_view_line(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.client.get(reverse('leaderboard'))
+
+        entries = [json.loads(line) for line in self.log.read_text().splitlines()]
+        from_view = [entry for entry in entries if entry['view'] and entry['view']['function'] == '_leaderboard_data']
+        self.assertTrue(from_view)
+        entry = from_view[0]
+        self.assertEqual(entry['view']['file'], os.path.join('training', 'views.py'))
+        self.assertIn('_leaderboard_data', entry['view']['code'] + entry['view']['function'])
+        self.assertTrue(entry['sql'].startswith('SELECT'))
+        self.assertTrue(entry['plan'])
+        self.assertNotIn('EXPLAIN failed', entry['plan'][0])
+        self.assertEqual(slowqueries.fingerprint('WHERE id IN (%s, %s, %s) LIMIT 25'), 'WHERE id IN (%s, ...) LIMIT ?')
+        # The metrics middleware's wrapper was removed after the request, the log's stays
+        self.assertEqual(connection.execute_wrappers, [slowqueries.log_slow_queries])
+
+    def test_reports_costliest_queries(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.client.get(reverse('leaderboard'))
+        self.client.get(reverse('leaderboard'))
+        stdout = StringIO()
+        call_command('slow_queries', '--top', '3', '--sort', 'count', stdout=stdout)
+        self.assertEqual(stdout.getvalue().count(' run(s), '), 3)
+
+        stdout = StringIO()
+        call_command('slow_queries', '--top', '100', stdout=stdout)
+        report = stdout.getvalue()
+        self.assertIn('2 run(s)', report)
+        self.assertIn('training/views.py:', report)
+        self.assertIn('  plan:   ', report)
+
+        with override_settings(SLOW_QUERY_LOG=Path(self.log.parent, 'missing.jsonl')):
+            with self.assertRaises(CommandError):
+                call_command('slow_queries')
+
+    def test_logging_failures_do_not_fail_queries(self):
+        trainee = User.objects.create_user('trainee', password='secret')
+        self.client.force_login(trainee)
+        self.log.write_text('')
+        # The log's directory is a file, every write fails
+        with override_settings(SLOW_QUERY_LOG=self.log / 'slow.jsonl'):
+            with self.assertLogs('training.slowqueries', 'ERROR'):
+                self.assertEqual(self.client.get(reverse('leaderboard')).status_code, 200)
+
+        # A failing query raises its own error and is not logged
+        with self.assertRaisesMessage(DatabaseError, 'no such table'):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT * FROM no_such_table')
+        self.assertEqual(self.log.read_text(), '')
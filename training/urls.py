@@ -7,31 +7,37 @@ urlpatterns = [
     path('scenarios/', views.scenarios, name='scenarios'),
     path('achievements/', views.achievements, name='achievements'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('leaderboard/api/', views.leaderboard_api, name='leaderboard_api'),
     path('profile/', views.profile, name='profile'),
     path('burns-learning/', views.burns_learning, name='burns_learning'),
-    path('burns-quiz/', views.burns_quiz, name='burns_quiz'),
+    path('burns-quiz/', views.quiz, {'slug': 'burns_quiz'}, name='burns_quiz'),
     path('wounds-learning/', views.wounds_learning, name='wounds_learning'),
-    path('wounds-quiz/', views.wounds_quiz, name='wounds_quiz'),
+    path('wounds-quiz/', views.quiz, {'slug': 'wounds_quiz'}, name='wounds_quiz'),
     path('fractures-learning/', views.fractures_learning, name='fractures_learning'),
-    path('fractures-quiz/', views.fractures_and_sprains_quiz, name='fractures_and_sprains_quiz'),
+    path('fractures-quiz/', views.quiz, {'slug': 'fractures_and_sprains_quiz'}, name='fractures_and_sprains_quiz'),
     path('cardiac-emergencies-learning/', views.cardiac_emergencies_learning, name='cardiac_emergencies_learning'),
-    path('cardiac-emergencies-quiz/', views.cardiac_emergencies_quiz, name='cardiac_emergencies_quiz'),
+    path('cardiac-emergencies-quiz/', views.quiz, {'slug': 'cardiac_emergencies_quiz'}, name='cardiac_emergencies_quiz'),
     path('choking-learning/', views.choking_learning, name='choking_learning'),
-    path('choking-quiz/', views.choking_quiz, name='choking_quiz'),
+    path('choking-quiz/', views.quiz, {'slug': 'choking_quiz'}, name='choking_quiz'),
     path('heat-learning/', views.heat_learning, name='heat_learning'),
-    path('heat-quiz/', views.heat_quiz, name='heat_quiz'),
+    path('heat-quiz/', views.quiz, {'slug': 'heat_quiz'}, name='heat_quiz'),
     path('cold-learning/', views.cold_learning, name='cold_learning'),
-    path('cold-quiz/', views.cold_quiz, name='cold_quiz'),
+    path('cold-quiz/', views.quiz, {'slug': 'cold_quiz'}, name='cold_quiz'),
     path('poison-learning/', views.poison_learning, name='poison_learning'),
-    path('poison-quiz/', views.poison_quiz, name='poison_quiz'),
+    path('poison-quiz/', views.quiz, {'slug': 'poison_quiz'}, name='poison_quiz'),
     path('venom-learning/', views.venom_learning, name='venom_learning'),
-    path('venom-quiz/', views.venom_quiz, name='venom_quiz'),
+    path('venom-quiz/', views.quiz, {'slug': 'venom_quiz'}, name='venom_quiz'),
     path('allergy-learning/', views.allergy_learning, name='allergy_learning'),
-    path('allergy-quiz/', views.allergy_quiz, name='allergy_quiz'),
+    path('allergy-quiz/', views.quiz, {'slug': 'allergy_quiz'}, name='allergy_quiz'),
+    path('quiz/<slug:slug>/', views.quiz, name='quiz'),
+    path('quiz/<slug:slug>/bundle/<str:version>.json', views.quiz_bundle_json, name='quiz_bundle'),
     path('register/', views.register, name='register'),
     path('login/', views.login, name='login'),
     path('logout/', views.logout, name='logout'),
-    path('restraunt-scenario/', views.RestrauntScenario, name='RestrauntScenario'),
-    path('hiking-scenario/', views.HikingScenario, name='HikingScenario'),
-    path('burns-scenario/', views.BurnsScenario, name='BurnsScenario'),
+    path('restraunt-scenario/', views.scenario, {'slug': 'restaurant_scenario'}, name='RestrauntScenario'),
+    path('hiking-scenario/', views.scenario, {'slug': 'hiking_scenario'}, name='HikingScenario'),
+    path('burns-scenario/', views.scenario, {'slug': 'burns_scenario'}, name='BurnsScenario'),
+    path('scenario/<slug:slug>/', views.scenario, name='scenario'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('scenario/<slug:slug>/graph/<str:version>.json', views.scenario_graph_json, name='scenario_graph'),
 ]
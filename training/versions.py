@@ -0,0 +1,36 @@
+"""Version counters kept in a cache.
+
+Cached data that other processes may change is stored under, or compared
+against, a version read with ``current``; a writer calls ``bump`` and
+every reader moves on to the new version. Counters start from the clock
+rather than 1, so a counter that was evicted or lost never hands out a
+version an old cached entry is still stored under.
+
+The counters only reach other processes through a cache they share:
+with a local-memory backend a bump is seen by its own process alone.
+"""
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def current(cache, key):
+    """The version stored at ``key``, started from the clock if there is none."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(cache, key):
+    """Move the version at ``key`` on."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def is_shared(cache):
+    """Whether other processes see the versions kept in ``cache``."""
+    return not isinstance(cache, LocMemCache)
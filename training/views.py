@@ -1,15 +1,27 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import render, redirect
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
 from django.contrib.auth import login as auth_login, authenticate, logout as auth_logout
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Module, UserModuleProgress,Achievement,UserAchievement,Scenario,UserScenarioProgress
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import UserModuleProgress,Achievement,UserAchievement,UserScenarioProgress
+from . import catalogue
+from .metrics import render_prometheus
+from .pagecache import cached_page
+from .quizbank import quiz_bundle
+from .scenariograph import scenario_graph
+from .leaderboard import leaderboard_page, leaderboard_window, next_rank_points, rank_of
+from .pipeline import buffered_submissions_enabled, submission_buffer
+from .routers import replica_reads
+from .progress import SCENARIO_PASSING_SCORE, submit_quiz_score, submit_scenario_score
+from .stats import get_user_stats
 from .forms import QuizScoreForm, ScenarioScoreForm
-from django.db import models
-from django.db.models import F, Sum, Count, Value, ExpressionWrapper, Q
-from django.db.models.functions import Coalesce
+from django.db.models import Exists, OuterRef
 import logging
-import time
 
 logger = logging.getLogger(__name__)
 
@@ -17,78 +29,36 @@ def home(request):
     return render(request, 'home.html')
 
 @login_required
+@replica_reads
 def achievements(request):
-    # Load all achievements and user's current achievements
-    print(">> Achievements view loaded")
-    user_progress = UserModuleProgress.objects.filter(user=request.user)
-    module_points = user_progress.aggregate(total=models.Sum('score'))['total'] or 0
-    scenario_points = UserScenarioProgress.objects.filter(user=request.user).aggregate(total=models.Sum('score'))['total'] or 0
-    total_points = module_points + scenario_points
-
-    completed_modules = user_progress.filter(completed=True)
-    completed_modules_count = user_progress.filter(completed=True).count()
-    completed_scenarios_count = UserScenarioProgress.objects.filter(user=request.user, completed=True).count()
-
-    all_achievements = Achievement.objects.all()
-    user_achievements = UserAchievement.objects.filter(user=request.user)
-    earned_ids = {ua.achievement.id for ua in user_achievements}
-
-    # Prepare achievement lookup
-    achievements_by_title = {a.title: a for a in all_achievements}
-
-    def unlock(title, condition):
-        print(f"Checking unlock: {title}, Condition: {condition}")
-        if title in achievements_by_title:
-            achievement = achievements_by_title[title]
-            print(f"Achievement found: {achievement}")
-            if condition and achievement.id not in earned_ids:
-                print("Unlocking achievement...")
-                UserAchievement.objects.create(user=request.user, achievement=achievement)
-                messages.success(request, f"Achievement Unlocked: {title}!")
-                earned_ids.add(achievement.id)
-            else:
-                print("Already earned or condition false.")
-        else:
-            print(f"Title '{title}' not found in achievements_by_title")
-
-
-    # Achievement logic
-    unlock('First Steps', completed_modules_count >= 1)
-    unlock('Life Saver', completed_modules_count == 10)
-    unlock('Quick Thinker', user_progress.filter(completed=True, time_spent__lt=30).exists())
-    unlock('Expert Medic', total_points >= 1000)
-    unlock('All Star', completed_modules_count == 10 and completed_scenarios_count == 3)
-    unlock('Academic Ace', completed_modules_count >= 5)
-    unlock('Simulation Pro',completed_scenarios_count >= 3)
-    unlock('Trailblazer',completed_scenarios_count >= 1)
-    for progress in completed_modules:
-        unlock('Perfect Score',progress.score == 100)
-
-    
+    # Achievements are unlocked when progress is saved (see training.achievements),
+    # so the page only has to read what the user has already earned
+    all_achievements = Achievement.objects.annotate(
+        achieved=Exists(UserAchievement.objects.filter(user=request.user, achievement=OuterRef('pk')))
+    )
 
-    # Prepare context for template
     achievements_data = [
         {
             'achievement': ach,
-            'achieved': ach.id in earned_ids
+            'achieved': ach.achieved
         }
         for ach in all_achievements
     ]
+    earned_ids = {entry['achievement'].id for entry in achievements_data if entry['achieved']}
 
     context = {
         'achievements': achievements_data,
         'unlocked_count': len(earned_ids),
         'earned_ids': earned_ids,
     }
-    print("Context being sent to template:", context)
-
     return render(request, 'achievements.html', context)
 
 @login_required
+@replica_reads
 def modules(request):
-    user = request.user
-    completed_progress = UserModuleProgress.objects.filter(user=user, completed=True)
-    completed_modules = set(progress.module.title for progress in completed_progress)
+    # Module ids straight from the progress index, turned into slugs by the cached catalogue
+    completed_ids = UserModuleProgress.objects.filter(user=request.user, completed=True).values_list('module_id', flat=True)
+    completed_modules = catalogue.module_slugs(completed_ids)
 
     context = {
         'completed_modules': completed_modules,
@@ -100,676 +70,231 @@ def modules(request):
 def scenarios(request):
     return render(request, 'scenarios.html')
 
-@login_required(login_url='login')
-def leaderboard(request):
-    # Get all users and annotate their total score and completed modules
-    users_with_scores = (
-        User.objects.annotate(
-            module_points=Coalesce(Sum('module_progress__score', distinct=True), 0),
-            scenario_points=Coalesce(Sum('scenario_progress__score', distinct=True), 0),
-            total_points=ExpressionWrapper(
-                F('module_points') + F('scenario_points'),
-                output_field=models.IntegerField()
-            ),
-            completed_modules=Coalesce(
-                Count('module_progress', filter=Q(module_progress__completed=True), distinct=True), 0
-            )
-        )
-        .order_by('-total_points')
-    )
-
-    total_items = 13  # Module.objects.count() + Scenario.objects.count()
-    user_progress = UserModuleProgress.objects.filter(user=request.user)
-    completed_modules_count = user_progress.filter(completed=True).count()
-    completed_scenarios_count = UserScenarioProgress.objects.filter(user=request.user, completed=True).count()
-    
-    progress_percent = ((completed_modules_count + completed_scenarios_count) / total_items) * 100
-
-    # Generate leaderboard entries with rank and level
-    leaderboard = []
-    for idx, user in enumerate(users_with_scores, start=1):
-        completed = user.completed_modules
-        if completed >= 8:
-            level = "Expert"
-        elif completed >= 5:
-            level = "Advanced"
-        elif completed >= 2:
-            level = "Intermediate"
-        else:
-            level = "Beginner"
+def _leaderboard_data(request):
+    # Totals are kept up to date in UserScore, so every lookup here is an
+    # index range scan whose cost doesn't depend on the number of trainees
+    stats = get_user_stats(request.user)
+    page, entries = leaderboard_page(request.GET.get('page'), settings.LEADERBOARD_PAGE_SIZE)
+    return {
+        'page': page,
+        'leaderboard': entries,
+        'window': leaderboard_window(stats, settings.LEADERBOARD_WINDOW),
+        'stats': stats,
+        'current_rank': rank_of(stats),
+        'next_rank_points': next_rank_points(stats),
+    }
 
-        leaderboard.append({
-            'rank': idx,
-            'user': user,
-            'total_points': user.total_points or 0,
-            'completed_modules': completed,
-            'level': level
-        })
 
-    # Get current user's rank and points
-    current_user_entry = next((entry for entry in leaderboard if entry['user'] == request.user), None)
-    current_rank = current_user_entry['rank'] if current_user_entry else "-"
-    your_points = current_user_entry['total_points'] if current_user_entry else 0
+@login_required(login_url='login')
+@replica_reads
+def leaderboard(request):
+    data = _leaderboard_data(request)
+    stats = data['stats']
 
-    # Find points to next rank (if any)
-    higher_ranks = [entry for entry in leaderboard if entry['rank'] < current_rank]
-    next_rank_points = (higher_ranks[-1]['total_points'] - your_points) if higher_ranks else 0
+    total_items = catalogue.item_count()
+    progress_percent = ((stats.completed_modules + stats.completed_scenarios) / total_items) * 100 if total_items else 0
 
     context = {
-        'leaderboard': leaderboard,
-        'current_rank': current_rank,
-        'next_rank_points': next_rank_points,
-        'completed_scenarios': completed_scenarios_count,
+        'leaderboard': data['leaderboard'],
+        'page_obj': data['page'],
+        'window': data['window'],
+        'current_rank': data['current_rank'],
+        'next_rank_points': data['next_rank_points'],
+        'completed_scenarios': stats.completed_scenarios,
         'progress_percent': int(progress_percent)
     }
     return render(request, 'leaderboard.html', context)
 
-@login_required(login_url='login')
-def profile(request):
-    # Get all module progress for current user
-    user_progress = UserModuleProgress.objects.filter(user=request.user)
-    # Calculate total points (sum of all scores)
-    module_points = user_progress.aggregate(total=models.Sum('score'))['total'] or 0
-    scenario_points = UserScenarioProgress.objects.filter(user=request.user).aggregate(total=models.Sum('score'))['total'] or 0
-    total_points = module_points + scenario_points
-    # Count completed modules
-    completed_modules = user_progress.filter(completed=True)
-    completed_modules_count = user_progress.filter(completed=True).count()
-    completed_scenarios_count = UserScenarioProgress.objects.filter(user=request.user, completed=True).count()
-    achievement_count = UserAchievement.objects.filter(user=request.user).count()
-
-    
-    # Calculate the accuracy for each completed module
-    module_accuracies = []
-    for progress in completed_modules:
-        accuracy = (progress.score / 100) * 100  # Assuming each module is worth 100 points
-        module_accuracies.append(accuracy)
-
-    # Calculate the average accuracy across all completed modules
-    if module_accuracies:
-        avg_accuracy = sum(module_accuracies) / len(module_accuracies)
-    else:
-        avg_accuracy = 0  # If no modules are completed
 
-    # Capping the accuracy at 100%
-    avg_accuracy = min(avg_accuracy, 100)
+@login_required(login_url='login')
+@replica_reads
+def leaderboard_api(request):
+    data = _leaderboard_data(request)
+    page = data['page']
+
+    def serialize(entries):
+        return [
+            {
+                'rank': entry['rank'],
+                'username': entry['user'].username,
+                'total_points': entry['total_points'],
+                'completed_modules': entry['completed_modules'],
+                'level': entry['level'],
+            }
+            for entry in entries
+        ]
+
+    return JsonResponse({
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'leaderboard': serialize(data['leaderboard']),
+        'window': serialize(data['window']),
+        'current_rank': data['current_rank'],
+        'total_points': data['stats'].total_points,
+        'next_rank_points': data['next_rank_points'],
+    })
 
+@login_required(login_url='login')
+@replica_reads
+def profile(request):
+    stats = get_user_stats(request.user)
 
     # Total number of modules
-    total_modules = Module.objects.count()
-    
-    # Determine level based on completed modules
-    level = "Beginner"
-    if completed_modules_count >= 8:
-        level = "Expert"
-    elif completed_modules_count >= 5:
-        level = "Advanced"
-    elif completed_modules_count >= 2:
-        level = "Intermediate"
-    
+    total_modules = len(catalogue.modules())
+
     context = {
-        'user_progress': user_progress,
-        'total_points': total_points,
-        'completed_modules': completed_modules_count,
+        'total_points': stats.total_points,
+        'completed_modules': stats.completed_modules,
         'total_modules': total_modules,
-        'level': level,
-        'accuracy':avg_accuracy,
-        'achievement_count': achievement_count,
-        'completed_scenarios_count':completed_scenarios_count
+        'level': stats.level,
+        'accuracy': stats.accuracy,
+        'achievement_count': stats.achievement_count,
+        'completed_scenarios_count': stats.completed_scenarios
     }
     return render(request, 'profile.html', context)
 
+@cached_page('burns_learning.html')
 def burns_learning(request):
     return render(request, 'burns_learning.html')
 
-@login_required
-def burns_quiz(request):
-    module = get_object_or_404(Module, slug='burns_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('burns_learning')
-            else:
-                return redirect('burns_quiz')
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-        
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'burns_quiz.html', context)
-
+@cached_page('wounds_learning.html')
 def wounds_learning(request):
     return render(request, 'wounds_learning.html')
 
-@login_required
-def wounds_quiz(request):
-    module = get_object_or_404(Module, slug='wounds_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('wounds_learning')
-            else:
-                return redirect('wounds_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-        
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'wounds_quiz.html', context)
-
+@cached_page('fractures_and_sprains_learning.html')
 def fractures_learning(request):
     return render(request, 'fractures_and_sprains_learning.html')
 
-@login_required
-def fractures_and_sprains_quiz(request):
-    module = get_object_or_404(Module, slug='fractures_and_sprains_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('fractures_learning')
-            else:
-                return redirect('fractures_and_sprains_quiz')
-        
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-        
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'fractures_and_sprains_quiz.html', context)
-
+@cached_page('cardiac_emergencies_learning.html')
 def cardiac_emergencies_learning(request):
     return render(request, 'cardiac_emergencies_learning.html')
 
-@login_required
-def cardiac_emergencies_quiz(request):
-    module = get_object_or_404(Module, slug='cardiac_emergencies_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('cardiac_emergencies_learning')
-            else:
-                return redirect('cardiac_emergencies_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-    
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'cardiac_emergencies_quiz.html', context)
-
-
+@cached_page('choking_learning.html')
 def choking_learning(request):
     return render(request, 'choking_learning.html')
 
-@login_required
-def choking_quiz(request):
-    module = get_object_or_404(Module, slug='choking_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('choking_learning')
-            else:
-                return redirect('choking_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-    
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'choking_quiz.html', context)
-
-
+@cached_page('heat_learning.html')
 def heat_learning(request):
     return render(request, 'heat_learning.html')
 
-@login_required
-def heat_quiz(request):
-    module = get_object_or_404(Module, slug='heat_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('heat_learning')
-            else:
-                return redirect('heat_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-    
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'heat_quiz.html', context)
-
-
+@cached_page('cold_learning.html')
 def cold_learning(request):
     return render(request, 'cold_learning.html')
 
-@login_required
-def cold_quiz(request):
-    module = get_object_or_404(Module, slug='cold_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('cold_learning')
-            else:
-                return redirect('cold_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'cold_quiz.html', context)
-
+@cached_page('poison_learning.html')
 def poison_learning(request):
     return render(request, 'poison_learning.html')
 
-@login_required
-def poison_quiz(request):
-    
-    module = get_object_or_404(Module, slug='poison_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('poison_learning')
-            else:
-                return redirect('poison_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'poison_quiz.html', context)
-
+@cached_page('venom_learning.html')
 def venom_learning(request):
     return render(request, 'venom_learning.html')
 
-@login_required
-def venom_quiz(request):
-    module = get_object_or_404(Module, slug='venom_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
-    if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-       
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
-            else:
-                progress.save()  # Save to increment attempts
-                #  messages.info(request, "Your previous score was higher.")
-                
-            # Redirect back to the same page to show updated score
-            if request.POST.get("action") == "back":
-                return redirect('venom_learning')
-            else:
-                return redirect('venom_quiz')
-
-    else:
-        form = QuizScoreForm(module_slug=module.slug)
-
-
-    context = {
-        'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'venom_quiz.html', context)
-
-
-
+@cached_page('allergy_learning.html')
 def allergy_learning(request):
     return render(request, 'allergy_learning.html')
 
+
+# Learning page each quiz's "Back" button returns to, by module slug
+QUIZ_LEARNING_PAGES = {
+    'burns_quiz': 'burns_learning',
+    'wounds_quiz': 'wounds_learning',
+    'fractures_and_sprains_quiz': 'fractures_learning',
+    'cardiac_emergencies_quiz': 'cardiac_emergencies_learning',
+    'choking_quiz': 'choking_learning',
+    'heat_quiz': 'heat_learning',
+    'cold_quiz': 'cold_learning',
+    'poison_quiz': 'poison_learning',
+    'venom_quiz': 'venom_learning',
+    'allergy_quiz': 'allergy_learning',
+}
+
+
+def _announce_achievements(request, unlocked):
+    # Buffered submissions unlock theirs later, without a request to tell
+    for achievement in unlocked:
+        messages.success(request, f"Achievement Unlocked: {achievement.title}!")
+
+
+QUIZ_TEMPLATES = {
+    'burns_quiz': 'burns_quiz.html',
+    'wounds_quiz': 'wounds_quiz.html',
+    'fractures_and_sprains_quiz': 'fractures_and_sprains_quiz.html',
+    'cardiac_emergencies_quiz': 'cardiac_emergencies_quiz.html',
+    'choking_quiz': 'choking_quiz.html',
+    'heat_quiz': 'heat_quiz.html',
+    'cold_quiz': 'cold_quiz.html',
+    'poison_quiz': 'poison_quiz.html',
+    'venom_quiz': 'venom_quiz.html',
+    'allergy_quiz': 'allergy_quiz.html',
+}
+
 @login_required
-def allergy_quiz(request):
-    """View for the allergy quiz"""
-    module = get_object_or_404(Module, slug='allergy_quiz')
-    progress, created = UserModuleProgress.objects.get_or_create(
-        user=request.user, 
-        module=module
-    )
-    
+def quiz(request, slug):
+    """Quiz page for any module that has one in ``QUIZ_TEMPLATES``."""
+    module = catalogue.module_or_404(slug)
+    if module.slug not in QUIZ_TEMPLATES:
+        # A module added without a quiz page
+        raise Http404("No quiz page for this module")
+
     if request.method == 'POST':
-        form = QuizScoreForm(request.POST)
+        form = QuizScoreForm(request.POST, max_score=module.max_score)
         if form.is_valid():
-            new_score = form.cleaned_data['score']
-            new_time_spent = form.cleaned_data['time_spent']
-            
-            # Update attempts counter
-            progress.attempts += 1
-
-            if new_time_spent is not None and (progress.time_spent is None or new_time_spent < progress.time_spent):
-                progress.time_spent = new_time_spent
-                progress.save()
-    
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                progress.completed =  progress.score >= module.passing_score
-                progress.save()
-                # messages.success(request, "Your score has been updated!")
+            if buffered_submissions_enabled():
+                submission_buffer().submit_quiz(
+                    request.user.pk, module,
+                    form.cleaned_data['score'],
+                    form.cleaned_data['time_spent'],
+                )
             else:
-                progress.save()  # Save to increment attempts
-                # messages.info(request, "Your previous score was higher.")
-                
+                unlocked = submit_quiz_score(
+                    request.user, module,
+                    form.cleaned_data['score'],
+                    form.cleaned_data['time_spent'],
+                )
+                _announce_achievements(request, unlocked)
+
             # Redirect back to the same page to show updated score
             if request.POST.get("action") == "back":
-                return redirect('allergy_learning')
+                return redirect(QUIZ_LEARNING_PAGES.get(module.slug, 'modules'))
             else:
-                return redirect('allergy_quiz')
-
+                return redirect(request.path)
     else:
         form = QuizScoreForm(module_slug=module.slug)
 
-
+    progress = UserModuleProgress.objects.filter(user=request.user, module_id=module.pk).first()
     context = {
         'module': module,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
+        'current_score': progress.score if progress else 0,
+        'completed': progress.completed if progress else False,
+        'attempts': progress.attempts if progress else 0,
+        'form': form,
+        'bundle_url': reverse('quiz_bundle', args=[module.slug, quiz_bundle(module).version]),
     }
-    return render(request, 'allergy_quiz.html', context)
+    return render(request, QUIZ_TEMPLATES[module.slug], context)
 
 
+def _versioned_json(request, url_name, slug, version, current_version, content):
+    """Serve ``content`` forever under its version, or redirect an old version to the current one."""
+    if version != current_version:
+        # A page rendered before the content changed, send it to the new version
+        response = redirect(url_name, slug, current_version)
+        response['Cache-Control'] = 'no-cache'
+        return response
 
+    etag = f'"{current_version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def quiz_bundle_json(request, slug, version):
+    """A module's questions as JSON, at a URL that changes whenever they do."""
+    module = catalogue.module_or_404(slug)
+    bundle = quiz_bundle(module)
+    return _versioned_json(request, 'quiz_bundle', module.slug, version, bundle.version, bundle.content)
 
 
 def register(request):
@@ -813,145 +338,66 @@ def logout(request):
     auth_logout(request)
     return redirect('login')
 
-def RestrauntScenario(request):
-    scenario = get_object_or_404(Scenario, slug='restaurant_scenario')
-    progress, created = UserScenarioProgress.objects.get_or_create(
-        user=request.user, 
-        scenario=scenario
-    )
-    
-    if request.method == 'POST':
-        form = ScenarioScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            # Get time_spent from POST, default to 0 if None or empty
-            new_time_spent = form.cleaned_data.get('time_spent') or 0
-            
-            # Update attempts counter once per submission
-            progress.attempts += 1
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                # Example passing score is 33
-                progress.completed = progress.score >= 33
-                progress.time_spent = new_time_spent
-                progress.save()
-                messages.success(request, f"Your score of {new_score} has been updated! " +
-                                             ("You successfully completed the scenario!" if progress.completed else "Try again to improve your performance."))
-            else:
-                progress.save()  # Only update attempts
-                # messages.info(request, "Your score has been updated")
-                
-            if request.POST.get("action") == "back":
-                return redirect('scenarios')
-            else:
-                return redirect('RestrauntScenario')
-    else:
-        form = ScenarioScoreForm(scenario_slug=scenario.slug)
-    
-    context = {
-        'scenario': scenario,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'restraunt_scenario.html', context)
-
-def HikingScenario(request):
-    scenario = get_object_or_404(Scenario, slug='hiking_scenario')
-    progress, created = UserScenarioProgress.objects.get_or_create(
-        user=request.user, 
-        scenario=scenario
-    )
-    
-    if request.method == 'POST':
-        form = ScenarioScoreForm(request.POST)
-        if form.is_valid():
-            new_score = form.cleaned_data['score']
-            # Get time_spent from POST, default to 0 if None or empty
-            new_time_spent = form.cleaned_data.get('time_spent') or 0
-            
-            # Update attempts counter once per submission
-            progress.attempts += 1
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                # Example passing score is 33
-                progress.completed = progress.score >= 33
-                progress.time_spent = new_time_spent
-                progress.save()
-                messages.success(request, f"Your score of {new_score} has been updated! " +
-                                             ("You successfully completed the scenario!" if progress.completed else "Try again to improve your performance."))
-            else:
-                progress.save()  # Only update attempts
-                # messages.info(request, "Your score has been updated")
-                
-            if request.POST.get("action") == "back":
-                return redirect('scenarios')
-            else:
-                return redirect('HikingScenario')
-    else:
-        form = ScenarioScoreForm(scenario_slug=scenario.slug)
-    
-    context = {
-        'scenario': scenario,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
-    }
-    return render(request, 'hiking_scenario.html', context)
+# Scenario templates by scenario slug
+SCENARIO_TEMPLATES = {
+    'restaurant_scenario': 'restraunt_scenario.html',
+    'hiking_scenario': 'hiking_scenario.html',
+    'burns_scenario': 'burns_scenario.html',
+}
 
 @login_required
-def BurnsScenario(request):
-    scenario = get_object_or_404(Scenario, slug='burns_scenario')
-    progress, created = UserScenarioProgress.objects.get_or_create(
-        user=request.user, 
-        scenario=scenario
-    )
-    
+def scenario(request, slug):
+    """Scenario page for any scenario that has one in ``SCENARIO_TEMPLATES``."""
+    scenario = catalogue.scenario_or_404(slug)
+    if scenario.slug not in SCENARIO_TEMPLATES:
+        # A scenario added without a page
+        raise Http404("No page for this scenario")
+
     if request.method == 'POST':
         form = ScenarioScoreForm(request.POST)
         if form.is_valid():
             new_score = form.cleaned_data['score']
             # Get time_spent from POST, default to 0 if None or empty
             new_time_spent = form.cleaned_data.get('time_spent') or 0
-            
-            # Update attempts counter once per submission
-            progress.attempts += 1
-            
-            # Only update score if new score is higher
-            if new_score > progress.score:
-                progress.score = new_score
-                # Example passing score is 33
-                progress.completed = progress.score >= 33
-                progress.time_spent = new_time_spent
-                progress.save()
-                messages.success(request, f"Your score of {new_score} has been updated! " +
-                                             ("You successfully completed the scenario!" if progress.completed else "Try again to improve your performance."))
+
+            if buffered_submissions_enabled():
+                # Written shortly by the submission buffer, there is no previous best to compare yet
+                submission_buffer().submit_scenario(request.user.pk, scenario, new_score, new_time_spent)
             else:
-                progress.save()  # Only update attempts
-                # if progress.attempts>1:
-                #     messages.info(request, "Your previous score was higher.")
-                # else:
-                #     messages.info(request, "Your score has been updated")
+                improved, unlocked = submit_scenario_score(request.user, scenario, new_score, new_time_spent)
+                if improved:
+                    completed = new_score >= SCENARIO_PASSING_SCORE
+                    messages.success(request, f"Your score of {new_score} has been updated! " +
+                                                 ("You successfully completed the scenario!" if completed else "Try again to improve your performance."))
+                _announce_achievements(request, unlocked)
+
             if request.POST.get("action") == "back":
                 return redirect('scenarios')
             else:
-                return redirect('BurnsScenario')
+                return redirect(request.path)
     else:
         form = ScenarioScoreForm(scenario_slug=scenario.slug)
-    
+
+    progress = UserScenarioProgress.objects.filter(user=request.user, scenario_id=scenario.pk).first()
     context = {
         'scenario': scenario,
-        'current_score': progress.score,
-        'completed': progress.completed,
-        'attempts': progress.attempts,
-        'form': form
+        'current_score': progress.score if progress else 0,
+        'completed': progress.completed if progress else False,
+        'attempts': progress.attempts if progress else 0,
+        'form': form,
+        'graph_url': reverse('scenario_graph', args=[scenario.slug, scenario_graph(scenario).version]),
     }
+    return render(request, SCENARIO_TEMPLATES[scenario.slug], context)
+
+
+def scenario_graph_json(request, slug, version):
+    """A scenario's step graph as JSON, at a URL that changes whenever it does."""
+    scenario = catalogue.scenario_or_404(slug)
+    graph = scenario_graph(scenario)
+    return _versioned_json(request, 'scenario_graph', scenario.slug, version, graph.version, graph.content)
 
-    return render(request, 'burns_scenario.html', context)
 
+@staff_member_required
+def metrics(request):
+    """Request metrics of every worker, for Prometheus to scrape."""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')